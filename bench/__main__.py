@@ -0,0 +1,242 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from scraper import CONFIG_FILE, DownloadStats, ScraperEngine, load_config
+from scraper.metrics import metrics
+
+from .gallery import GalleryOptions, GalleryServer
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Benchmark the scraper end-to-end against a local synthetic gallery")
+    parser.add_argument("--images", type=int, default=200, help="Number of images in the gallery")
+    parser.add_argument("--sizes", default="1280x720,800x1200,640x640", help="Image sizes, cycled through (WxH,...)")
+    parser.add_argument("--formats", default="jpeg,png,webp", help="Image formats, cycled through")
+    parser.add_argument("--lazy", action="store_true", help="Use data-src lazy loading swapped in by JavaScript")
+    parser.add_argument("--infinite-scroll", action="store_true", help="Append --page-size images per scroll")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--videos", type=int, default=0, help="Number of videos with posters")
+    parser.add_argument("--video-kb", type=int, default=2048, help="Size of each video")
+    parser.add_argument("--latency-ms", type=int, default=0, help="Delay added before every response")
+    parser.add_argument("--bandwidth-kbps", type=int, default=0, help="Per-connection bandwidth cap in KiB/s (0 = none)")
+    parser.add_argument("--mode", choices=["auto", "static", "browser"], default="auto",
+                        help="auto uses the static fast path when the page allows it")
+    parser.add_argument("--media-type", choices=["photos", "videos", "both"], default="both")
+    parser.add_argument("--scrolls", type=int, default=None, help="Scroll count (defaults to enough for every page)")
+    parser.add_argument("--runs", type=int, default=3, help="Cold runs, each with empty caches")
+    parser.add_argument("--no-download", action="store_true", help="Stop after the thumbnails")
+    parser.add_argument("--config", default=CONFIG_FILE, help="Scraper configuration to benchmark")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--serve", action="store_true", help="Only serve the gallery until interrupted")
+    parser.add_argument("-o", "--output", default="-", help="Append one JSON line per invocation to this file ('-' prints to stdout)")
+    return parser.parse_args(argv)
+
+def gallery_options(args):
+    sizes = [tuple(int(part) for part in size.lower().split("x")) for size in args.sizes.split(",") if size]
+    return GalleryOptions(
+        images=args.images, sizes=sizes, formats=[fmt for fmt in args.formats.split(",") if fmt],
+        lazy=args.lazy, infinite_scroll=args.infinite_scroll, page_size=args.page_size,
+        videos=args.videos, video_kb=args.video_kb, latency_ms=args.latency_ms, bandwidth_kbps=args.bandwidth_kbps,
+    )
+
+def peak_rss_mb():
+    # Highest resident set size so far, for this process and for reaped children (thumbnail workers, Chrome)
+    if resource is None:
+        return None, None
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024  # ru_maxrss is bytes on macOS, KiB elsewhere
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / (1024 * 1024)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / (1024 * 1024)
+    return round(own, 1), round(children, 1)
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+class StageTimer:
+    def __init__(self):
+        self.stages = {}
+
+    def run(self, name, function, *args):
+        started = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            self.stages[name] = {'seconds': round(time.perf_counter() - started, 4)}
+
+# Engine spans reported inside the scrape stage, so a slow page load shows up by name
+SCRAPE_SPANS = ('static_fetch', 'driver_get', 'scroll_page', 'wait_for_images', 'network_log', 'extract')
+
+def span_seconds():
+    # Total seconds per stage recorded by the engine's metrics spans so far in this process
+    with metrics.lock:
+        return {dict(key)['stage']: histogram.sum for (name, key), histogram in metrics.histograms.items()
+                if name == 'scraper_stage_seconds'}
+
+def scrape_tiles(engine, options):
+    # Runs ScraperEngine.stream_tiles exactly as the window does: the bounded producer/consumer
+    # pipeline, cookie sync and job-store writes included. Returns (tiles, first tile seconds).
+    tiles = []
+    first_tile = []
+    result = {}
+    started = time.perf_counter()
+    lock = threading.Lock()
+
+    def emit(kind, payload):
+        if kind == 'done':
+            result['error'] = payload
+            return
+        with lock:
+            if not first_tile:
+                first_tile.append(time.perf_counter() - started)
+            tiles.append(payload)
+
+    engine.stream_tiles(options, emit)
+    if result.get('error'):
+        raise RuntimeError(result['error'])
+    return tiles, (first_tile[0] if first_tile else None)
+
+def run_once(args, url, base_config):
+    with tempfile.TemporaryDirectory(prefix="scraper-bench-") as workdir:
+        # Fresh cache, dedup index, job store and download folder so every run is cold
+        configdata = dict(base_config,
+                          cacheDirectory=os.path.join(workdir, "cache"),
+                          dedupIndexPath=os.path.join(workdir, "dedup.sqlite3"),
+                          jobStorePath=os.path.join(workdir, "jobs.sqlite3"),
+                          staticFastPath=args.mode != "browser")
+        download_path = os.path.join(workdir, "downloads")
+        os.makedirs(download_path)
+
+        scroll_count = args.scrolls
+        if scroll_count is None:
+            scroll_count = -(-args.images // args.page_size) + 1 if args.infinite_scroll else 2
+
+        timer = StageTimer()
+        started = time.perf_counter()
+        engine = ScraperEngine(configdata, on_status=lambda message: None)
+        # The thumbnailer is shared per process, so tiles from the previous run are dropped
+        engine.thumbnailer.clear()
+        try:
+            if args.mode == "browser":
+                timer.run('browser_start', engine.start_browser)
+
+            options = {'url': url, 'scroll_count': scroll_count, 'crawl_depth': 0, 'media_type': args.media_type,
+                       'filters': {'class': "", 'id': "", 'src': ""}, 'load_images': True}
+            spans_before = span_seconds()
+            tiles, first_tile = timer.run('scrape', scrape_tiles, engine, options)
+            spans = span_seconds()
+            static = engine.static_page is not None
+            if args.mode == "static" and not static:
+                raise RuntimeError("The gallery cannot be scraped without a browser, use --mode auto or browser")
+            timer.stages['scrape'].update(
+                items=len(tiles), first_tile_seconds=first_tile and round(first_tile, 4),
+                spans={name: round(spans[name] - spans_before.get(name, 0), 4) for name in SCRAPE_SPANS if name in spans},
+            )
+            # The window downloads the tiles it shows, so do the same
+            jobs = [dict(tile, image=None) for tile in tiles]
+
+            if not args.no_download:
+                stats = DownloadStats(len(jobs))
+                results = timer.run('download', engine.download, list(enumerate(jobs)), download_path, stats)
+                snapshot = stats.snapshot()
+                timer.stages['download'].update(
+                    items=len(results), downloaded=snapshot['downloaded'], skipped=snapshot['skipped'],
+                    failed=snapshot['failed'], mb=round(snapshot['mb'], 3),
+                )
+        finally:
+            engine.close()
+            engine.thumbnailer.shutdown()
+
+        total = time.perf_counter() - started
+        for stage in timer.stages.values():
+            if stage.get('items') and stage['seconds']:
+                stage['items_per_sec'] = round(stage['items'] / stage['seconds'], 2)
+            if stage.get('mb') and stage['seconds']:
+                stage['mb_per_sec'] = round(stage['mb'] / stage['seconds'], 3)
+
+        own_rss, children_rss = peak_rss_mb()
+        return {
+            'path': 'static' if static else 'browser',
+            'total_seconds': round(total, 4),
+            'items_per_sec': round(len(jobs) / total, 2) if total else None,
+            'stages': timer.stages,
+            'peak_rss_mb': own_rss,
+            'peak_children_rss_mb': children_rss,
+        }
+
+def summarize(runs):
+    # Median of every stage timing across the runs
+    summary = {'total_seconds': statistics.median(run['total_seconds'] for run in runs), 'stages': {}}
+    for name in runs[0]['stages']:
+        values = [run['stages'][name]['seconds'] for run in runs if name in run['stages']]
+        summary['stages'][name] = {'median_seconds': round(statistics.median(values), 4),
+                                   'min_seconds': min(values), 'max_seconds': max(values)}
+    summary['peak_rss_mb'] = max((run['peak_rss_mb'] or 0) for run in runs)
+    return summary
+
+def main(argv=None):
+    args = parse_args(argv)
+    options = gallery_options(args)
+
+    print(f"Rendering {options.images} images and {options.videos} videos...", file=sys.stderr)
+    server = GalleryServer(options, port=args.port).start()
+    print(f"Serving synthetic gallery at {server.url}", file=sys.stderr)
+
+    try:
+        if args.serve:
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                return 0
+
+        try:
+            base_config = load_config(args.config)
+        except Exception as e:
+            print(f"Failed to load JSON configuration: {e}", file=sys.stderr)
+            base_config = {}
+
+        runs = []
+        for number in range(args.runs):
+            result = run_once(args, server.url, base_config)
+            print(f"Run {number + 1}/{args.runs}: {result['total_seconds']:.2f}s via {result['path']}", file=sys.stderr)
+            runs.append(result)
+
+        report = {
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'gallery': options.as_dict(),
+            'mode': args.mode,
+            'media_type': args.media_type,
+            'runs': runs,
+            'summary': summarize(runs),
+            'server': {'requests': server.gallery.requests, 'mb_served': round(server.gallery.bytes_served / (1024 * 1024), 3)},
+        }
+    finally:
+        server.stop()
+
+    if args.output == "-":
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.output, "a") as f:
+            f.write(json.dumps(report) + "\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,247 @@
+import random
+import re
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+
+from PIL import Image
+
+FORMATS = {
+    'jpeg': ("jpg", "image/jpeg"),
+    'png': ("png", "image/png"),
+    'webp': ("webp", "image/webp"),
+}
+RANGE_HEADER = re.compile(r"bytes=(\d*)-(\d*)$")
+
+# Appends the next page of items when the sentinel scrolls into view
+INFINITE_SCROLL_SCRIPT = """
+<script>
+let nextPage = 1, loading = false;
+const sentinel = document.getElementById('sentinel');
+new IntersectionObserver(async entries => {
+    if (!entries[0].isIntersecting || loading || nextPage < 0) return;
+    loading = true;
+    const response = await fetch('/more?page=' + nextPage);
+    const html = await response.text();
+    if (html.trim()) {
+        sentinel.insertAdjacentHTML('beforebegin', html);
+        nextPage++;
+    } else {
+        nextPage = -1;
+    }
+    loading = false;
+}).observe(sentinel);
+</script>
+"""
+
+# Swaps data-src into src when an image comes near the viewport
+LAZY_LOAD_SCRIPT = """
+<script>
+const lazyObserver = new IntersectionObserver(entries => {
+    for (const entry of entries) {
+        if (entry.isIntersecting && entry.target.dataset.src) {
+            entry.target.src = entry.target.dataset.src;
+            delete entry.target.dataset.src;
+            lazyObserver.unobserve(entry.target);
+        }
+    }
+}, {rootMargin: '200px'});
+const observeLazy = () => document.querySelectorAll('img[data-src]').forEach(img => lazyObserver.observe(img));
+observeLazy();
+new MutationObserver(observeLazy).observe(document.body, {childList: true, subtree: true});
+</script>
+"""
+
+class GalleryOptions:
+    # Shape of the synthetic gallery and the network conditions it is served under
+    def __init__(self, images=200, sizes=((1280, 720), (800, 1200), (640, 640)), formats=("jpeg", "png", "webp"),
+                 lazy=False, infinite_scroll=False, page_size=50, videos=0, video_kb=2048,
+                 latency_ms=0, bandwidth_kbps=0, seed=0):
+        self.images = images
+        self.sizes = [tuple(size) for size in sizes]
+        self.formats = list(formats)
+        self.lazy = lazy
+        self.infinite_scroll = infinite_scroll
+        self.page_size = page_size
+        self.videos = videos
+        self.video_kb = video_kb
+        self.latency_ms = latency_ms
+        self.bandwidth_kbps = bandwidth_kbps
+        self.seed = seed
+
+    def as_dict(self):
+        return dict(vars(self), sizes=[list(size) for size in self.sizes])
+
+def render_image(index, size, fmt, seed):
+    # A smooth, distinct picture per index: random colors upscaled, so encoders behave
+    # like they do on photos and the dedup index never mistakes two items for one
+    rng = random.Random(seed * 1000003 + index)
+    small = Image.new("RGB", (16, 16))
+    small.putdata([(rng.randrange(256), rng.randrange(256), rng.randrange(256)) for _ in range(256)])
+    image = small.resize(size, Image.BICUBIC)
+    output = BytesIO()
+    if fmt == "png":
+        image.save(output, format="PNG")
+    else:
+        image.save(output, format=fmt.upper(), quality=85)
+    return output.getvalue()
+
+class Gallery:
+    # Pre-renders every asset so generating them is never part of what gets measured
+    def __init__(self, options):
+        self.options = options
+        self.images = []
+        for index in range(options.images):
+            fmt = options.formats[index % len(options.formats)]
+            size = options.sizes[index % len(options.sizes)]
+            extension, mime_type = FORMATS[fmt]
+            self.images.append((f"/img/{index}.{extension}", mime_type, render_image(index, size, fmt, options.seed), size))
+
+        self.posters = [render_image(10000 + index, (640, 360), "jpeg", options.seed) for index in range(options.videos)]
+        filler = random.Random(options.seed).randbytes(options.video_kb * 1024)
+        # Distinct leading bytes keep every video a different file
+        self.video_bodies = [index.to_bytes(8, "big") + filler[8:] for index in range(options.videos)]
+        self.bytes_served = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def item_html(self, index):
+        path, _, _, (width, height) = self.images[index]
+        if self.options.lazy:
+            return f'<img data-src="{path}" loading="lazy" width="{width}" height="{height}" alt="item {index}">\n'
+        return f'<img src="{path}" width="{width}" height="{height}" alt="item {index}">\n'
+
+    def video_html(self, index):
+        return (f'<video controls preload="none" poster="/poster/{index}.jpg">'
+                f'<source src="/video/{index}.mp4" type="video/mp4"></video>\n')
+
+    def page_html(self):
+        first = self.options.page_size if self.options.infinite_scroll else self.options.images
+        body = "".join(self.item_html(index) for index in range(min(first, self.options.images)))
+        body += "".join(self.video_html(index) for index in range(self.options.videos))
+        scripts = ""
+        if self.options.infinite_scroll:
+            body += '<div id="sentinel" style="height:1px"></div>\n'
+            scripts += INFINITE_SCROLL_SCRIPT
+        if self.options.lazy:
+            scripts += LAZY_LOAD_SCRIPT
+        return ("<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>Synthetic gallery</title>"
+                "<style>img{display:block;max-width:100%;height:auto}</style></head>\n"
+                f"<body>\n{body}{scripts}</body></html>\n")
+
+    def more_html(self, page):
+        start = page * self.options.page_size
+        end = min(start + self.options.page_size, self.options.images)
+        return "".join(self.item_html(index) for index in range(start, end))
+
+    def count(self, sent):
+        with self.lock:
+            self.requests += 1
+            self.bytes_served += sent
+
+class GalleryHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.handle_request(head=True)
+
+    def do_GET(self):
+        self.handle_request(head=False)
+
+    def handle_request(self, head):
+        gallery = self.server.gallery
+        if gallery.options.latency_ms:
+            time.sleep(gallery.options.latency_ms / 1000)
+
+        parsed = urllib.parse.urlparse(self.path)
+        path = parsed.path
+        try:
+            if path in ("/", "/index.html"):
+                self.send_body(gallery.page_html().encode(), "text/html; charset=utf-8", head)
+            elif path == "/more":
+                page = int(urllib.parse.parse_qs(parsed.query).get("page", ["0"])[0])
+                self.send_body(gallery.more_html(page).encode(), "text/html; charset=utf-8", head)
+            elif path.startswith("/img/"):
+                index = int(path[5:].split(".")[0])
+                _, mime_type, data, _ = gallery.images[index]
+                self.send_body(data, mime_type, head)
+            elif path.startswith("/poster/"):
+                self.send_body(gallery.posters[int(path[8:].split(".")[0])], "image/jpeg", head)
+            elif path.startswith("/video/"):
+                self.send_body(gallery.video_bodies[int(path[7:].split(".")[0])], "video/mp4", head, ranges=True)
+            else:
+                self.send_error(404)
+        except (ValueError, IndexError):
+            self.send_error(404)
+
+    def send_body(self, data, content_type, head, ranges=False):
+        start, end = 0, len(data) - 1
+        match = RANGE_HEADER.match(self.headers.get("Range", "")) if ranges else None
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), end) if match.group(2) else end
+            else:
+                start = max(0, len(data) - int(match.group(2)))
+            if start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(data)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        else:
+            self.send_response(200)
+
+        body = memoryview(data)[start:end + 1]
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        if not head:
+            self.write_throttled(body)
+            self.server.gallery.count(len(body))
+
+    def write_throttled(self, body):
+        # Per-connection bandwidth cap, written in 16 KiB slices
+        bandwidth = self.server.gallery.options.bandwidth_kbps * 1024
+        if not bandwidth:
+            self.wfile.write(body)
+            return
+        started = time.monotonic()
+        for offset in range(0, len(body), 16384):
+            self.wfile.write(body[offset:offset + 16384])
+            ahead = (offset + 16384) / bandwidth - (time.monotonic() - started)
+            if ahead > 0:
+                time.sleep(ahead)
+
+class GalleryServer:
+    # Serves a Gallery on localhost from a background thread
+    def __init__(self, options, host="127.0.0.1", port=0):
+        self.gallery = Gallery(options)
+        self.httpd = ThreadingHTTPServer((host, port), GalleryHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.gallery = self.gallery
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
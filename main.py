@@ -1,135 +1,232 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import requests
-from PIL import Image, ImageTk
 from io import BytesIO
-import urllib.parse
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-import time
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
 import os
 import threading
-import urllib.request
+import queue
 import json
 from pathlib import Path
 
-configfile = "data/config.json"
+from scraper import CONFIG_FILE, DownloadStats, ScraperEngine, load_config
+
+configfile = CONFIG_FILE
+
+# Finished thumbnails are handed to Tk in batches of this size, every TILE_DRAIN_INTERVAL ms
+TILE_BATCH_SIZE = 24
+TILE_DRAIN_INTERVAL = 50
+# How often (ms) the Tk thread drains download progress events, 10 Hz however fast files finish
+DOWNLOAD_PROGRESS_INTERVAL = 100
+# How often (ms) the Tk thread checks whether Chrome has finished starting in the background
+BROWSER_CHECK_INTERVAL = 200
+# Fixed grid cell size, so any item's position can be computed without a widget
+CELL_WIDTH = 220
+CELL_HEIGHT = 280
+# Extra rows materialized above and below the viewport, and the resize debounce (ms)
+GRID_OVERSCAN_ROWS = 2
+GRID_RELAYOUT_DELAY = 100
+
 def loadJsonConfiguration():
     try:
-        with open(configfile, "r") as file:
-            configdata = json.load(file)
-        return configdata
+        return load_config(configfile)
     except Exception as e:
         messagebox.showerror("Error", f"Failed to load JSON configuration: {e}")
         return {}
 
-def get_video_size(video_url):
-    try:
-        response = requests.head(video_url, timeout=5)
-        response.raise_for_status()
-        size_in_bytes = int(response.headers.get('Content-Length', 0))
-        size_in_mb = size_in_bytes / (1024 * 1024)  # Convert bytes to MB
-        return round(size_in_mb, 2)  # Round to 2 decimal places
-    except Exception as e:
-        print(f"Failed to get video size: {e}")
-        return None
-
-def fetch_image(poster_url, ref):
-    try:
-        req = urllib.request.Request(
-            poster_url,
-            headers={"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"}
-        )
-        response = urllib.request.urlopen(req)
-        return response.read()
-    except Exception as e:
-        print(f"Failed to load poster image: {e}")
+def compress_tile(image):
+    # Runs on the thumbnail worker threads: tiles are kept as small encoded bytes
+    # and only turned into a PhotoImage while they are on screen
+    if image is None:
         return None
+    image.thumbnail((200, 200))
+    buffer = BytesIO()
+    if image.mode == "RGBA":
+        image.save(buffer, "PNG")
+    else:
+        image.convert("RGB").save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+def format_eta(seconds):
+    if seconds is None:
+        return "--:--"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+class MediaTile(ttk.Frame):
+    # One grid cell. Tiles are recycled: show() rebinds the same widgets to another media item.
+    def __init__(self, parent, on_toggle):
+        super().__init__(parent, width=CELL_WIDTH - 10, height=CELL_HEIGHT - 10)
+        self.pack_propagate(False)
+        self.on_toggle = on_toggle
+        self.index = None
+        self.photo = None
+        self.checkbox_var = tk.BooleanVar()
 
-class ImageFrame(ttk.Frame):
-    def __init__(self, parent, image, checkbox_var, *args, **kwargs):
-        super().__init__(parent, *args, **kwargs)
-        self.checkbox_var = checkbox_var
-        
         # Create an inner frame for the image and overlay
         self.image_container = ttk.Frame(self)
         self.image_container.pack(expand=True, fill="both")
-        
+
         # Create the image label
-        self.image_label = ttk.Label(self.image_container, image=image)
-        self.image_label.image = image  # Keep a reference
+        self.image_label = ttk.Label(self.image_container, anchor="center")
         self.image_label.pack(expand=True, fill="both")
-        
+
         # Create a checkbutton with transparent background
         style = ttk.Style()
         style.configure("Transparent.TCheckbutton", background="white")
         self.checkbox = ttk.Checkbutton(
             self.image_container,
-            variable=checkbox_var,
-            style="Transparent.TCheckbutton"
+            variable=self.checkbox_var,
+            style="Transparent.TCheckbutton",
+            command=self.on_check
         )
         self.checkbox.place(x=5, y=5)  # Position at top-left corner
-        
+
+        # Video size, only packed for videos
+        self.size_label = ttk.Label(self)
+        self.source_label = ttk.Label(self, wraplength=200)
+        self.source_label.pack()
+
         # Bind click events to the entire frame
         self.image_label.bind("<Button-1>", self.toggle_selection)
-        
-    def toggle_selection(self, event=None):
-        self.checkbox_var.set(not self.checkbox_var.get())
 
-class VideoFrame(ttk.Frame):
-    def __init__(self, parent, video_url, checkbox_var, poster_url, video_size):
-        super().__init__(parent)  # Correct initialization
-        
-        self.video_url = video_url
-        self.checkbox_var = checkbox_var
-        
-        # Create an inner frame for the video and overlay
-        self.video_container = ttk.Frame(self)
-        self.video_container.pack(expand=True, fill="both")
-
-        # Load and display the poster image
-        if poster_url:
-            try:
-                image_data = fetch_image(poster_url)
-                if image_data:
-                    image = Image.open(BytesIO(image_data))
-                    image = image.resize((200, 120), Image.LANCZOS)
-                    self.poster_photo = ImageTk.PhotoImage(image)
-                image = Image.open(BytesIO(image_data))
-                image = image.resize((200, 120), Image.LANCZOS)  # Resize for consistency
-                self.poster_photo = ImageTk.PhotoImage(image)
-
-                # Label to display the image
-                self.video_label = ttk.Label(self.video_container, image=self.poster_photo)
-                self.video_label.pack(expand=True, fill="both")
-            except Exception as e:
-                print(f"Failed to load poster image: {e}")
-                self.video_label = ttk.Label(self.video_container, text="Video Preview", background="lightgray")
-                self.video_label.pack(expand=True, fill="both")
+    def show(self, index, item, photo, selected):
+        self.index = index
+        self.photo = photo  # Keep a reference
+        if photo is not None:
+            self.image_label.configure(image=photo, text="", background="")
         else:
             # If no poster is available, show a placeholder
-            self.video_label = ttk.Label(self.video_container, text="Video Preview", background="lightgray")
-            self.video_label.pack(expand=True, fill="both")
+            self.image_label.configure(image="", text="Video Preview", background="lightgray")
 
-        # Display video size instead of duration
-        self.size_label = ttk.Label(self, text=f"📦 {video_size} MB" if video_size else "📦 Size: Unknown")
-        self.size_label.pack()
+        if item['type'] == 'video':
+            video_size = item.get('size')
+            self.size_label.configure(text=f"📦 {video_size} MB" if video_size else "📦 Size: Unknown")
+            self.size_label.pack(before=self.source_label)
+        else:
+            self.size_label.pack_forget()
 
-        # Checkbox overlay
-        self.checkbox = ttk.Checkbutton(self.video_container, variable=checkbox_var)
-        self.checkbox.place(x=5, y=5)  # Top-left corner
+        self.source_label.configure(text=f"Source: {item['src'][:50]}...")
+        self.checkbox_var.set(selected)
 
-        # Bind click event to select/deselect
-        self.video_label.bind("<Button-1>", self.toggle_selection)
+    def release(self):
+        self.index = None
+        self.photo = None
+        self.image_label.configure(image="")
 
     def toggle_selection(self, event=None):
         self.checkbox_var.set(not self.checkbox_var.get())
+        self.on_check()
+
+    def on_check(self):
+        if self.index is not None:
+            self.on_toggle(self.index, self.checkbox_var.get())
+
+class MediaGrid:
+    # Virtualized grid on a canvas: only rows in the viewport (plus GRID_OVERSCAN_ROWS)
+    # have widgets, everything else is just an entry in items/thumbnails/selected.
+    def __init__(self, root, canvas):
+        self.root = root
+        self.canvas = canvas
+        self.items = []
+        self.thumbnails = []  # Encoded bytes, or None for videos without a poster
+        self.selected = []
+        self.active = {}  # index -> (tile, canvas window id)
+        self.spare = []  # (tile, canvas window id) hidden and ready for reuse
+        self.columns = 1
+        self.refresh_pending = False
+        self.relayout_job = None
+
+    def clear(self):
+        for index in list(self.active):
+            self.recycle(index)
+        self.items = []
+        self.thumbnails = []
+        self.selected = []
+        self.canvas.yview_moveto(0)
+        self.refresh()
+
+    def append(self, item, thumbnail):
+        self.items.append(item)
+        self.thumbnails.append(thumbnail)
+        self.selected.append(False)
+
+    def set_all(self, value):
+        self.selected = [value] * len(self.items)
+        for tile, _ in self.active.values():
+            tile.checkbox_var.set(value)
+
+    def on_toggle(self, index, value):
+        self.selected[index] = value
+
+    def selected_indices(self):
+        return [i for i, selected in enumerate(self.selected) if selected]
+
+    def schedule_refresh(self):
+        if not self.refresh_pending:
+            self.refresh_pending = True
+            self.root.after_idle(self.refresh)
+
+    def schedule_relayout(self, event=None):
+        # <Configure> fires continuously while resizing, so relayout once it settles
+        if self.relayout_job is not None:
+            self.root.after_cancel(self.relayout_job)
+        self.relayout_job = self.root.after(GRID_RELAYOUT_DELAY, self.relayout)
+
+    def relayout(self):
+        self.relayout_job = None
+        columns = max(1, self.canvas.winfo_width() // CELL_WIDTH)
+        if columns != self.columns:
+            self.columns = columns
+            for index in list(self.active):
+                self.recycle(index)
+        self.refresh()
+
+    def refresh(self):
+        self.refresh_pending = False
+        rows = (len(self.items) + self.columns - 1) // self.columns
+        self.canvas.configure(scrollregion=(0, 0, self.columns * CELL_WIDTH, rows * CELL_HEIGHT))
+
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        first_row = max(0, int(top // CELL_HEIGHT) - GRID_OVERSCAN_ROWS)
+        last_row = int(bottom // CELL_HEIGHT) + GRID_OVERSCAN_ROWS
+        visible = range(first_row * self.columns, min(len(self.items), (last_row + 1) * self.columns))
+
+        for index in list(self.active):
+            if index not in visible:
+                self.recycle(index)
+
+        for index in visible:
+            if index not in self.active:
+                self.materialize(index)
+
+    def materialize(self, index):
+        if self.spare:
+            tile, window_id = self.spare.pop()
+        else:
+            tile = MediaTile(self.canvas, self.on_toggle)
+            window_id = self.canvas.create_window(0, 0, window=tile, anchor="nw")
 
+        photo = None
+        if self.thumbnails[index] is not None:
+            try:
+                from PIL import Image, ImageTk  # Deferred until the first tile, so the window opens sooner
+                photo = ImageTk.PhotoImage(Image.open(BytesIO(self.thumbnails[index])))
+            except Exception as e:
+                print(f"Failed to load thumbnail: {e}")
+
+        tile.show(index, self.items[index], photo, self.selected[index])
+        row, column = divmod(index, self.columns)
+        self.canvas.coords(window_id, column * CELL_WIDTH + 5, row * CELL_HEIGHT + 5)
+        self.canvas.itemconfigure(window_id, state="normal")
+        self.active[index] = (tile, window_id)
+
+    def recycle(self, index):
+        tile, window_id = self.active.pop(index)
+        tile.release()
+        self.canvas.itemconfigure(window_id, state="hidden")
+        self.canvas.coords(window_id, -2 * CELL_WIDTH, -2 * CELL_HEIGHT)  # Off-screen in case hiding is ignored
+        self.spare.append((tile, window_id))
 
 class ImageScraperUI:
     def __init__(self, root):
@@ -137,19 +234,16 @@ class ImageScraperUI:
         self.root.title("Darkgoatie's Website Media Scraper")
         self.root.geometry("1200x800")
         self.media = []  # Store both images and videos
-        self.checkboxes = []
-        self.driver = None
-        self.session = requests.Session()
         self.is_processing = False
-        self.processed_urls = set()
-        self.media_frames = []
+        self.tile_queue = None
         self.configdata = loadJsonConfiguration()
+        self.engine = ScraperEngine(self.configdata, on_status=self.post_status)
 
         self.create_ui()
+        # Quits the Chrome started in the background and stops the process pools
+        self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
         self.setup_browser()
-
-        self.root.bind('<Configure>', self.on_window_resize)
-
+        self.offer_resume()
 
     def create_ui(self):
         # Main container
@@ -193,6 +287,15 @@ class ImageScraperUI:
         ttk.Label(filter_frame, text="Src contains:").pack(side="left")
         self.src_filter.pack(side="left", padx=5)
 
+        # WxH, or a single number for both; empty uses filterMinWidth/filterMinHeight
+        self.min_size_filter = ttk.Entry(filter_frame, width=9)
+        ttk.Label(filter_frame, text="Min size:").pack(side="left")
+        self.min_size_filter.pack(side="left", padx=5)
+
+        self.selector_filter = ttk.Entry(filter_frame, width=15)
+        ttk.Label(filter_frame, text="Inside selector:").pack(side="left")
+        self.selector_filter.pack(side="left", padx=5)
+
         # Scroll Frame
         scroll_frame = ttk.Frame(self.main_container, padding="5")
         scroll_frame.grid(row=3, column=0, sticky="ew")
@@ -200,6 +303,10 @@ class ImageScraperUI:
         self.scroll_count = ttk.Entry(scroll_frame, width=5)
         self.scroll_count.pack(side="left", padx=5)
         self.scroll_count.insert(0, self.configdata["defaultScrolls"])
+        ttk.Label(scroll_frame, text="Crawl depth:").pack(side="left", padx=(15, 0))
+        self.crawl_depth = ttk.Entry(scroll_frame, width=5)
+        self.crawl_depth.pack(side="left", padx=5)
+        self.crawl_depth.insert(0, "0")
 
         # Do not load images option
         self.do_not_load_images_var = tk.BooleanVar(value=False)
@@ -211,17 +318,16 @@ class ImageScraperUI:
         self.main_container.grid_rowconfigure(5, weight=1)
         self.main_container.grid_columnconfigure(0, weight=1)
 
-        self.canvas = tk.Canvas(canvas_frame)
+        self.canvas = tk.Canvas(canvas_frame, yscrollincrement=20)
         scrollbar = ttk.Scrollbar(canvas_frame, orient="vertical", command=self.canvas.yview)
-        self.scrollable_frame = ttk.Frame(self.canvas)
+        self.grid = MediaGrid(self.root, self.canvas)
 
-        self.scrollable_frame.bind(
-            "<Configure>",
-            lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all"))
-        )
+        def on_yscroll(first, last):
+            scrollbar.set(first, last)
+            self.grid.schedule_refresh()
 
-        self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
-        self.canvas.configure(yscrollcommand=scrollbar.set)
+        self.canvas.configure(yscrollcommand=on_yscroll)
+        self.canvas.bind("<Configure>", self.grid.schedule_relayout)
 
         scrollbar.pack(side="right", fill="y")
         self.canvas.pack(side="left", fill="both", expand=True)
@@ -293,6 +399,7 @@ class ImageScraperUI:
 
             # Reload the configuration data
             self.configdata = loadJsonConfiguration()
+            self.engine.configdata = self.configdata
 
             # Notify the user that the changes were saved successfully
             messagebox.showinfo("Success", "JSON configuration saved successfully!")
@@ -311,27 +418,11 @@ class ImageScraperUI:
         self.canvas.yview_scroll(-delta, "units")
         return "break"
 
-    def on_window_resize(self, event=None):
-        if hasattr(self, 'current_media'):
-            self.reorganize_grid()
-
-    def reorganize_grid(self):
-        for frame in self.media_frames:
-            frame.grid_forget()
-
-        window_width = self.canvas.winfo_width()
-        media_width = 220  # Media width + padding
-        num_columns = max(1, window_width // media_width)
-
-        for index, frame in enumerate(self.media_frames):
-            row = index // num_columns
-            col = index % num_columns
-            frame.grid(row=row, column=col, padx=5, pady=5, sticky="nsew")
-
-        for i in range(num_columns):
-            self.scrollable_frame.grid_columnconfigure(i, weight=1)
-
     def fetch_media(self):
+        if self.is_processing:
+            self.status_var.set("Still fetching media, please wait...")
+            return
+
         url = self.url_entry.get().strip()
         if not url:
             self.status_var.set("Please enter a URL")
@@ -340,283 +431,102 @@ class ImageScraperUI:
             url = 'https://' + url
 
         try:
-            for widget in self.scrollable_frame.winfo_children():
-                widget.destroy()
+            self.grid.clear()
             self.media = []
-            self.checkboxes = []
-            self.media_frames = []
-            self.processed_urls = set()
-
-            self.status_var.set("Loading page...")
-            self.root.update()
-
-            self.driver.get(url)
-            scroll_count = int(self.scroll_count.get() or "5")
-            self.scroll_page(scroll_count)
-
-            WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.TAG_NAME, "img"))
-            )
-
-            media_type = self.media_type.get()
-            if media_type in ["photos", "both"]:
-                self.fetch_images()
-            if media_type in ["videos", "both"]:
-                self.fetch_videos()
-
-            self.status_var.set(f"Found {len(self.media)} matching media items")
-            self.reorganize_grid()
-            self.canvas.configure(scrollregion=self.canvas.bbox("all"))
 
+            # Snapshot every widget value here, the discovery thread must not touch Tk
+            options = {
+                'url': url,
+                'scroll_count': int(self.scroll_count.get() or "5"),
+                # 0 scrapes only this page, otherwise follow links this many levels deep
+                'crawl_depth': int(self.crawl_depth.get() or "0"),
+                'media_type': self.media_type.get(),
+                'filters': self.get_filters(),
+                'load_images': not self.do_not_load_images_var.get(),
+            }
         except Exception as e:
             self.status_var.set(f"Error: {str(e)}")
+            return
 
-    def fetch_images(self):
-        unfilteredimages = self.driver.find_elements(By.TAG_NAME, "img")
-        images = list(filter(self.matches_filters, unfilteredimages))
-        total_images = len(images)
-        processed_count = 0
-    
-        self.status_var.set(f"Processing {total_images} images...")
-        self.root.update()
-
-    # Rest of the fetch_images method remains the same...
-
-        # First, capture a successful image request's headers
-        reference_headers = None
-        if images:
-            try:
-                # Execute JavaScript to capture headers from a successful image load
-                reference_headers = self.driver.execute_script("""
-                    return new Promise((resolve) => {
-                        // Create a test image
-                        const img = new Image();
-
-                        // Create a fetch observer
-                        const observer = new PerformanceObserver((list) => {
-                            const entries = list.getEntries();
-                            for (const entry of entries) {
-                                // Look for successful image loads
-                                if (entry.initiatorType === 'img' && entry.duration > 0) {
-                                    // Make a test request to get headers
-                                    fetch(entry.name, {
-                                        method: 'GET',
-                                        credentials: 'same-origin'
-                                    }).then(response => {
-                                        // Get the request headers from the browser
-                                        const headers = {};
-                                        headers['Referer'] = document.location.href;
-                                        headers['Origin'] = window.location.origin;
-                                        headers['Host'] = new URL(entry.name).host;
-                                        headers['Accept'] = 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8';
-                                        headers['Accept-Encoding'] = 'gzip, deflate, br';
-                                        headers['Connection'] = 'keep-alive';
-                                        headers['User-Agent'] = navigator.userAgent;
-                                        resolve(headers);
-                                    });
-                                }
-                            }
-                        });
-                
-                        // Start observing
-                        observer.observe({ entryTypes: ['resource'] });
-
-                        // Load the first image to trigger the observation
-                        img.src = arguments[0];
-                    });
-                """, images[0].get_attribute("src"))
-
-                print("Captured reference headers:", json.dumps(reference_headers, indent=2))
-
-            except Exception as e:
-                print(f"Error capturing reference headers: {e}")
-                reference_headers = {
-                    'Accept': 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8',
-                    'Accept-Encoding': 'gzip, deflate, br',
-                    'Connection': 'keep-alive',
-                    'User-Agent': self.driver.execute_script('return navigator.userAgent;'),
-                    'Referer': self.driver.current_url,
-                    'Origin': urllib.parse.urlparse(self.driver.current_url).scheme + '://' + urllib.parse.urlparse(self.driver.current_url).netloc,
-                }
+        self.is_processing = True
+        self.tile_queue = queue.Queue()
+        self.status_var.set("Loading page...")
 
-        session = requests.Session()
-        session.headers.update(reference_headers)
+        tile_queue = self.tile_queue
 
-        for img in images:
-            if not self.matches_filters(img):
-                continue
+        def emit(kind, payload):
+            if kind == 'tile':
+                payload = dict(payload, image=compress_tile(payload['image']))
+            tile_queue.put((kind, payload))
 
-            img_src = img.get_attribute("src")
-            if not img_src or img_src.startswith('data:'):
-                continue
+        threading.Thread(target=self.engine.stream_tiles, args=(options, emit), daemon=True).start()
+        self.root.after(TILE_DRAIN_INTERVAL, self.drain_tiles)
 
-            img_src = urllib.parse.urljoin(self.driver.current_url, img_src)
-            if img_src in self.processed_urls:
-                continue
+    def post_status(self, message):
+        # Called from engine threads, the Tk thread picks it up in drain_tiles
+        tile_queue = self.tile_queue
+        if tile_queue is not None:
+            tile_queue.put(('status', message))
 
-            self.processed_urls.add(img_src)
+    def drain_tiles(self):
+        finished = False
+        final_message = None
+        added = 0
 
+        while added < TILE_BATCH_SIZE:
             try:
-                # Adjust headers for this specific request
-                current_headers = reference_headers.copy()
-                parsed_url = urllib.parse.urlparse(img_src)
-
-                # Update domain-specific headers
-                current_headers['Host'] = parsed_url.netloc
-                if parsed_url.netloc != urllib.parse.urlparse(self.driver.current_url).netloc:
-                    current_headers['Sec-Fetch-Site'] = 'cross-site'
-                else:
-                    current_headers['Sec-Fetch-Site'] = 'same-origin'
-
-                if self.do_not_load_images_var.get() == False:
-                    # Make the request
-                    response = session.get(img_src, headers=current_headers, timeout=5)
-                    response.raise_for_status()
-
-                    if "image" not in response.headers.get("Content-Type", ""):
-                        continue
-
-                    img_pil = Image.open(BytesIO(response.content))
-                    if img_pil.width > 200:
-                        ratio = 200 / img_pil.width
-                        img_pil = img_pil.resize((200, int(img_pil.height * ratio)))
-
-                    photo = ImageTk.PhotoImage(img_pil)
-
-
-                if self.do_not_load_images_var.get() == True:
-                    img_pil = Image.new("RGB", (200, 200), (255, 255, 255))
-                    photo = ImageTk.PhotoImage(img_pil)
-
-                chk_var = tk.BooleanVar()
-                self.checkboxes.append(chk_var)
-
-                img_frame = ImageFrame(self.scrollable_frame, photo, chk_var)
-                self.media_frames.append(img_frame)
-                ttk.Label(img_frame, text=f"Source: {img_src[:50]}...", wraplength=200).pack()
-
-                self.media.append({'type': 'image', 'src': img_src})
-                processed_count += 1
-                self.status_var.set(f"Processing {processed_count}/{total_images} images...")
-                self.root.update()
-
-            except requests.exceptions.HTTPError as errh:
-                print(f"HTTP Error for {img_src}: {errh}")
-                if hasattr(errh, 'response'):
-                    print(f"Response status: {errh.response.status_code}")
-                    print("Response headers:")
-                    print(json.dumps(dict(errh.response.headers), indent=2))
-                continue
+                kind, payload = self.tile_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if kind == 'tile':
+                self.add_tile(payload)
+                added += 1
+            elif kind == 'status':
+                self.status_var.set(payload)
+            elif kind == 'done':
+                finished = True
+                final_message = payload
+                break
+
+        if finished:
+            self.is_processing = False
+            self.status_var.set(final_message or f"Found {len(self.media)} matching media items")
+            self.grid.refresh()
+            return
 
-            except Exception as e:
-                print(f"Error processing image {img_src}: {e}")
-                continue
-
-    def fetch_videos(self):
-        unfilteredvideos = self.driver.find_elements(By.TAG_NAME, "video")
-        videos = list(filter(self.matches_filters, unfilteredvideos))
-        total_videos = len(videos)
-        processed_count = 0
-
-        self.status_var.set(f"Processing {total_videos} videos...")
-        self.root.update()
-
-        for video in videos:
-            if not self.matches_filters(video):
-                continue
-
-            video_src = video.find_element(By.TAG_NAME, "source").get_attribute("src")
-            video_thumbnail = video.get_attribute("poster")
-
-            if not video_src:
-                continue
-
-            video_src = urllib.parse.urljoin(self.driver.current_url, video_src)
-            if video_src in self.processed_urls:
-                continue
-
-            self.processed_urls.add(video_src)
-
-            # Fetch video size
-            video_size = get_video_size(video_src)
-
-            chk_var = tk.BooleanVar()
-            self.checkboxes.append(chk_var)
-
-            # Create VideoFrame instance with the video size
-            video_frame = VideoFrame(self.scrollable_frame, video_src, chk_var, video_thumbnail, video_size)
-            self.media_frames.append(video_frame)
-
-            # Add source label below the video
-            ttk.Label(video_frame, text=f"Source: {video_src[:50]}...", wraplength=200).pack()
-
-            self.media.append({'type': 'video', 'src': video_src})
-            processed_count += 1
-            self.status_var.set(f"Processing {processed_count}/{total_videos} videos...")
-            self.root.update()
-
-    def matches_filters(self, element):
-        class_filter = self.class_filter.get().strip()
-        id_filter = self.id_filter.get().strip()
-        src_filter = self.src_filter.get().strip()
-        
-        if class_filter:
-            element_class = element.get_attribute("class")
-            if not element_class or class_filter not in element_class:
-                return False
-                
-        if id_filter:
-            element_id = element.get_attribute("id")
-            if not element_id or id_filter not in element_id:
-                return False
-                
-        if src_filter:
-            element_src = element.get_attribute("src")
-            if not element_src or src_filter not in element_src:
-                return False
-                
-        return True
-
-    def scroll_page(self, scroll_count):
-        last_height = self.driver.execute_script("return document.body.scrollHeight")
-        scrolls_without_change = 0
-        max_unchanged_scrolls = 3
-
-        for i in range(int(scroll_count)):
-            self.status_var.set(f"Scrolling page... ({i+1}/{scroll_count})")
-            self.root.update()
-
-            self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(0.5)
-
-            new_height = self.driver.execute_script("return document.body.scrollHeight")
-
-            if new_height == last_height:
-                scrolls_without_change += 1
-                if scrolls_without_change >= max_unchanged_scrolls:
-                    self.status_var.set("Reached bottom of page")
-                    break
-            else:
-                scrolls_without_change = 0
-
-            last_height = new_height
-
-            self.driver.execute_script("""
-                document.documentElement.scrollTop = 0;
-                document.documentElement.scrollTop = document.documentElement.scrollHeight;
-            """)
-            time.sleep(0.1)
+        if added:
+            self.grid.refresh()
+            self.status_var.set(f"Loaded {len(self.media)} media items...")
+        self.root.after(TILE_DRAIN_INTERVAL, self.drain_tiles)
+
+    def add_tile(self, tile):
+        item = {key: value for key, value in tile.items() if key != 'image'}
+        self.media.append(item)
+        self.grid.append(item, tile['image'])
+
+    def get_filters(self):
+        filters = {
+            'class': self.class_filter.get().strip(),
+            'id': self.id_filter.get().strip(),
+            'src': self.src_filter.get().strip(),
+            'selector': self.selector_filter.get().strip(),
+        }
+        min_size = self.min_size_filter.get().strip().lower()
+        if min_size:
+            width, _, height = min_size.partition("x")
+            filters['min_width'] = int(width)
+            filters['min_height'] = int(height or width)
+        return filters
 
     def select_all(self):
-        for chk in self.checkboxes:
-            chk.set(True)
+        self.grid.set_all(True)
     
     def deselect_all(self):
-        for chk in self.checkboxes:
-            chk.set(False)
+        self.grid.set_all(False)
 
     def download_selected(self):
-        selected_indices = [i for i, chk in enumerate(self.checkboxes) if chk.get()]
+        selected_indices = self.grid.selected_indices()
         if not selected_indices:
             messagebox.showinfo("Info", "No media selected")
             return
@@ -631,169 +541,123 @@ class ImageScraperUI:
             messagebox.showerror("Error", f"Could not create directory: {str(e)}")
             return
 
-        # Create a progress bar
+        items = [(idx, dict(self.media[idx])) for idx in selected_indices]
+        self.start_download(items, download_path)
+
+    def start_download(self, items, download_path, job_id=None):
+        stats = DownloadStats(len(items))
+
+        # Create a progress bar counting finished files across all transfers
         self.progress_bar = ttk.Progressbar(self.main_container, orient="horizontal", length=300, mode="determinate")
         self.progress_bar.grid(row=7, column=0, sticky="ew", pady=5)
+        self.progress_bar["maximum"] = len(items)
 
-        def download_thread():
-            downloaded = 0
-            skipped = 0
-            failed = 0
+        threading.Thread(target=self.run_download, args=(items, download_path, stats, job_id), daemon=True).start()
+        self.root.after(DOWNLOAD_PROGRESS_INTERVAL, self.update_download_progress, stats, download_path)
 
-            # Capture headers from a successful video request
-            reference_headers = None
-            try:
-                # Execute JavaScript to capture headers from a successful video load
-                reference_headers = self.driver.execute_script("""
-                    return new Promise((resolve) => {
-                        // Create a test video element
-                        const video = document.createElement('video');
-
-                        // Create a fetch observer
-                        const observer = new PerformanceObserver((list) => {
-                            const entries = list.getEntries();
-                            for (const entry of entries) {
-                                // Look for successful video loads
-                                if (entry.initiatorType === 'video' && entry.duration > 0) {
-                                    // Make a test request to get headers
-                                    fetch(entry.name, {
-                                        method: 'GET',
-                                        credentials: 'same-origin'
-                                    }).then(response => {
-                                        // Get the request headers from the browser
-                                        const headers = {};
-                                        headers['Referer'] = document.location.href;
-                                        headers['Origin'] = window.location.origin;
-                                        headers['Host'] = new URL(entry.name).host;
-                                        headers['Accept'] = 'video/mp4,video/webm,video/ogg';
-                                        headers['Accept-Encoding'] = 'gzip, deflate, br';
-                                        headers['Connection'] = 'keep-alive';
-                                        headers['User-Agent'] = navigator.userAgent;
-                                        resolve(headers);
-                                    });
-                                }
-                            }
-                        });
-
-                        // Start observing
-                        observer.observe({ entryTypes: ['resource'] });
-
-                        // Load the first video to trigger the observation
-                        video.src = arguments[0];
-                        video.load();
-                    });
-                """, self.media[selected_indices[0]]['src'])
-
-                print("Captured reference headers for video:", json.dumps(reference_headers, indent=2))
+    def run_download(self, items, download_path, stats, job_id):
+        # Always ends with stats.close(), so the progress tick stops even when the batch never started
+        error = None
+        try:
+            self.engine.download(items, download_path, stats, job_id)
+        except Exception as e:
+            print(f"Download failed: {e}")
+            error = str(e)
+        finally:
+            stats.close(error)
+
+    def offer_resume(self):
+        # A download that was still running when the app last closed (or crashed) can pick up where it stopped
+        if not self.engine.jobs:
+            return
+        job = self.engine.jobs.interrupted_job()
+        if not job:
+            return
+        items = self.engine.jobs.unfinished_items(job['id'])
+        if not items:
+            self.engine.jobs.set_job_status(job['id'], 'done')
+            return
+        if not messagebox.askyesno("Resume Download",
+                                   f"The download from {job['url']} was interrupted with {len(items)} media items left.\n"
+                                   f"Resume it into {job['download_path']}?"):
+            self.engine.jobs.set_job_status(job['id'], 'abandoned')
+            return
 
-            except Exception as e:
-                print(f"Error capturing reference headers for video: {e}")
-
-            if not reference_headers:
-                # Fallback headers if we couldn't capture real ones
-                reference_headers = {
-                    'Accept': 'video/mp4,video/webm,video/ogg',
-                    'Accept-Encoding': 'gzip, deflate, br',
-                    'Connection': 'keep-alive',
-                    'User-Agent': self.driver.execute_script('return navigator.userAgent;'),
-                    'Referer': self.driver.current_url,
-                    'Origin': urllib.parse.urlparse(self.driver.current_url).scheme + '://' + urllib.parse.urlparse(self.driver.current_url).netloc,
-                }
-
-            session = requests.Session()
-            session.headers.update(reference_headers)
-
-            for idx in selected_indices:
-                try:
-                    media_url = self.media[idx]['src']
-                    filename = os.path.basename(urllib.parse.urlparse(media_url).path)
-                    if not filename or filename.isspace():
-                        filename = f"media_{idx}.{'mp4' if self.media[idx]['type'] == 'video' else 'jpg'}"
-
-                    filepath = os.path.join(download_path, filename)
-
-                    # Check if the file already exists
-                    if os.path.exists(filepath):
-                        skipped += 1
-                        self.status_var.set(f"Skipping {filename}: File already exists")
-                        self.root.update()
-                        continue
-
-                    # Adjust headers for this specific request
-                    current_headers = reference_headers.copy()
-                    parsed_url = urllib.parse.urlparse(media_url)
-
-                    # Update domain-specific headers
-                    current_headers['Host'] = parsed_url.netloc
-                    if parsed_url.netloc != urllib.parse.urlparse(self.driver.current_url).netloc:
-                        current_headers['Sec-Fetch-Site'] = 'cross-site'
-                    else:
-                        current_headers['Sec-Fetch-Site'] = 'same-origin'
-
-                    response = session.get(media_url, headers=current_headers, stream=True, timeout=5)
-                    response.raise_for_status()
-
-                    base, ext = os.path.splitext(filepath)
-                    counter = 1
-                    while os.path.exists(filepath):
-                        filepath = f"{base}_{counter}{ext}"
-                        counter += 1
-
-                    total_size = int(response.headers.get('content-length', 0))
-                    downloaded_size = 0
-
-                    self.progress_bar["maximum"] = total_size
-
-                    with open(filepath, 'wb') as f:
-                        for chunk in response.iter_content(chunk_size=self.configdata["videoDownloadChunkSize"]):
-                            if chunk:  # filter out keep-alive new chunks
-                                f.write(chunk)
-                                downloaded_size += len(chunk)
-                                # Update progress bar
-                                self.progress_bar["value"] = downloaded_size
-                                self.status_var.set(f"Downloading {filename}: {downloaded_size / (1024 * 1024):.2f} MB / {total_size / (1024 * 1024):.2f} MB")
-                                self.root.update()
-
-                    downloaded += 1
-
-                except Exception as e:
-                    print(f"Error downloading {media_url}: {e}")
-                    failed += 1
-
-                self.status_var.set(f"Downloaded: {downloaded}, Skipped: {skipped}, Failed: {failed}")
-                self.root.update()
-
-            self.progress_bar.grid_forget()  # Hide progress bar after download
-            messagebox.showinfo("Download Complete", 
-                              f"Successfully downloaded {downloaded} media items\n"
-                              f"Skipped {skipped} media items (already exists)\n"
-                              f"Failed to download {failed} media items\n"
-                              f"Location: {os.path.abspath(download_path)}")
-
-        threading.Thread(target=download_thread, daemon=True).start()
+        download_path = job['download_path'] or "downloads"
+        try:
+            os.makedirs(download_path, exist_ok=True)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not create directory: {str(e)}")
+            return
+        self.start_download(items, download_path, job['id'])
+
+    def update_download_progress(self, stats, download_path):
+        # The only place download progress reaches Tk; workers just publish events to stats
+        snapshot = stats.snapshot()
+        self.progress_bar["value"] = snapshot['finished']
+        eta = format_eta(snapshot['eta'])
+        self.status_var.set(
+            f"Downloading {snapshot['finished']}/{snapshot['total']} "
+            f"({snapshot['files_per_sec']:.1f} files/s, {snapshot['current_mb_per_sec']:.2f} MB/s, ETA {eta}) - "
+            f"Downloaded: {snapshot['downloaded']}, Skipped: {snapshot['skipped']}, Failed: {snapshot['failed']}"
+        )
+
+        if not snapshot['done']:
+            self.root.after(DOWNLOAD_PROGRESS_INTERVAL, self.update_download_progress, stats, download_path)
+            return
+
+        self.progress_bar.grid_forget()  # Hide progress bar after download
+        if snapshot['error']:
+            self.status_var.set(f"Download failed: {snapshot['error']}")
+            messagebox.showerror("Download Failed",
+                                 f"The download stopped after {snapshot['finished']} of {snapshot['total']} media items:\n"
+                                 f"{snapshot['error']}")
+            return
+        self.status_var.set(
+            f"Downloaded: {snapshot['downloaded']}, Skipped: {snapshot['skipped']}, Failed: {snapshot['failed']} "
+            f"({snapshot['mb']:.2f} MB in {snapshot['elapsed']:.1f}s)"
+        )
+        messagebox.showinfo("Download Complete", 
+                          f"Successfully downloaded {snapshot['downloaded']} media items\n"
+                          f"Skipped {snapshot['skipped']} media items (already exists)\n"
+                          f"Failed to download {snapshot['failed']} media items\n"
+                          f"Location: {os.path.abspath(download_path)}")
 
     def setup_browser(self):
+        # Chrome starts in a background thread while the window is already usable (browserStartup
+        # "background"), or only when a page first needs it ("lazy"). A scrape that needs it
+        # before it is up waits in ensure_browser.
+        if self.configdata.get("browserStartup", "background") != "background":
+            return
+        self.browser_error = None
+        self.browser_thread = threading.Thread(target=self.start_browser_in_background, daemon=True)
+        self.browser_thread.start()
+        self.root.after(BROWSER_CHECK_INTERVAL, self.check_browser)
+
+    def start_browser_in_background(self):
         try:
-            chrome_options = Options()
-            chrome_options.add_argument("--headless")
-            chrome_options.add_argument("--disable-gpu")
-            chrome_options.add_argument("--no-sandbox")
-            chrome_options.add_argument("--disable-dev-shm-usage")
-            chrome_options.add_argument("--window-size=1920,1080")
-            
-            # Enable CDP logging
-            chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
-            
-            service = Service(ChromeDriverManager().install())
-            self.driver = webdriver.Chrome(service=service, options=chrome_options)
-            self.status_var.set("Browser initialized successfully")
+            self.engine.ensure_browser()
         except Exception as e:
-            self.status_var.set(f"Error initializing browser: {str(e)}")
+            self.browser_error = e
+
+    def check_browser(self):
+        if self.browser_thread.is_alive():
+            self.root.after(BROWSER_CHECK_INTERVAL, self.check_browser)
+            return
+        if self.is_processing:
+            return  # The status line belongs to the scrape now
+        if self.browser_error:
+            self.status_var.set(f"Error initializing browser: {str(self.browser_error)}")
+        else:
+            self.status_var.set("Browser initialized successfully")
 
     def on_closing(self):
-        if self.driver:
-            self.driver.quit()
-        self.session.close()
+        # Gone from the screen at once, while close() waits for a Chrome that is still starting
+        self.root.withdraw()
+        self.engine.close()
+        self.engine.thumbnailer.shutdown()
+        if self.engine.transcoder:
+            self.engine.transcoder.shutdown()
         self.root.destroy()
 
 if __name__ == "__main__":
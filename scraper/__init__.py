@@ -0,0 +1,3 @@
+from .config import CONFIG_FILE, get_max_workers, load_config
+from .download import DownloadStats
+from .engine import ScraperEngine
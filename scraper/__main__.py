@@ -0,0 +1,191 @@
+import argparse
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .archive import ShardWriter
+from .browser_pool import BrowserPool
+from .config import CONFIG_FILE, load_config
+from .crawl import Crawler
+from .engine import ScraperEngine
+from .jobs import JobStore
+from .net import make_session, normalize_url
+from .transcode import Transcoder
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m scraper", description="Scrape media from a list of pages without the UI")
+    parser.add_argument("urls", nargs="?", help="File with one page URL per line ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="downloads", help="Directory for downloaded files")
+    parser.add_argument("-m", "--manifest", default="manifest.jsonl", help="JSONL manifest to write ('-' for stdout)")
+    parser.add_argument("--media-type", choices=["photos", "videos", "both"], default="photos")
+    parser.add_argument("--class", dest="class_filter", default="", help="Only keep elements whose class contains this")
+    parser.add_argument("--id", dest="id_filter", default="", help="Only keep elements whose id contains this")
+    parser.add_argument("--src", dest="src_filter", default="", help="Only keep elements whose src contains this")
+    parser.add_argument("--src-pattern", default=None, help="Only keep elements whose src matches this regular expression")
+    parser.add_argument("--selector", default=None, help="Only keep elements inside ones matching this CSS selector")
+    parser.add_argument("--min-width", type=int, default=None, help="Minimum width in pixels (defaults to filterMinWidth)")
+    parser.add_argument("--min-height", type=int, default=None, help="Minimum height in pixels (defaults to filterMinHeight)")
+    parser.add_argument("--min-bytes", type=int, default=None, help="Minimum image transfer size (defaults to filterMinBytes)")
+    parser.add_argument("--scrolls", type=int, default=None, help="Scroll count (defaults to defaultScrolls)")
+    parser.add_argument("--config", default=CONFIG_FILE, help="Path to the JSON configuration")
+    parser.add_argument("--no-download", action="store_true", help="Only write the manifest")
+    parser.add_argument("--browsers", type=int, default=None, help="Pages scraped in parallel (defaults to browserPoolSize)")
+    parser.add_argument("--crawl-depth", type=int, default=0, help="Follow links from the given pages this many levels deep")
+    parser.add_argument("--scope", choices=["host", "domain", "prefix", "any"], default=None,
+                        help="Which links a crawl follows (defaults to crawlScope)")
+    parser.add_argument("--max-pages", type=int, default=None, help="Stop a crawl after this many pages (defaults to crawlMaxPages)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Finish the interrupted download of a page's last job instead of scraping it again")
+    parser.add_argument("--jobs", action="store_true", help="List recent jobs with item counts by status and exit")
+    args = parser.parse_args(argv)
+    if not args.urls and not args.jobs:
+        parser.error("the following arguments are required: urls")
+    return args
+
+def read_urls(path):
+    handle = sys.stdin if path == "-" else open(path, "r")
+    try:
+        return [line.strip() for line in handle if line.strip() and not line.lstrip().startswith("#")]
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+def scrape_page(pool, configdata, url, args, scroll_count, filters):
+    # Returns (results, ok, links); links are only collected when crawling
+    engine = ScraperEngine(configdata, on_status=lambda message: print(f"[{url}] {message}", file=sys.stderr))
+    try:
+        job = engine.jobs.interrupted_job(url) if args.resume and engine.jobs else None
+        if job:
+            # Straight from the job store: no page load, only what was left undone
+            items = engine.jobs.unfinished_items(job['id'])
+            engine.status(f"Resuming job {job['id']}: {len(items)} items left")
+            results = engine.download(items, job['download_path'] or args.output, job_id=job['id'])
+            return [dict(item, **result) for (_, item), result in zip(items, results)], True, []
+
+        # Server-rendered pages never touch Chrome, the rest lease a browser from the pool
+        if engine.load_static(url, filters):
+            links = engine.page_links() if args.crawl_depth else []
+            return collect_page(engine, url, args, filters), True, links
+
+        with pool.lease() as driver:
+            engine.driver = driver
+            engine.load_browser_page(url, scroll_count)
+            links = engine.page_links() if args.crawl_depth else []
+            return collect_page(engine, url, args, filters), True, links
+
+    except Exception as e:
+        print(f"Error scraping {url}: {e}", file=sys.stderr)
+        return [{'page': url, 'status': 'error', 'error': str(e)}], False, []
+
+    finally:
+        engine.close()
+
+def collect_page(engine, url, args, filters):
+    items = list(engine.iter_media(args.media_type, filters))
+    if engine.jobs:
+        engine.job_id = engine.jobs.create_job(url, {'url': url, 'media_type': args.media_type, 'filters': filters})
+        for idx, item in enumerate(items):
+            engine.jobs.add_item(engine.job_id, idx, item)
+        engine.jobs.set_job_status(engine.job_id, 'discovered')
+    if args.no_download:
+        # The sizes were already probed together while iterating, this only collects them
+        for item in items:
+            if item['type'] == 'video':
+                item['size'] = engine.video_sizes.size_mb(item['src'], {'Referer': item['page']})
+        return [dict(item, status='found') for item in items]
+
+    results = engine.download(list(enumerate(items)), args.output)
+    return [dict(item, **result) for item, result in zip(items, results)]
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    try:
+        configdata = load_config(args.config)
+    except Exception as e:
+        print(f"Failed to load JSON configuration: {e}", file=sys.stderr)
+        configdata = {}
+
+    if args.jobs:
+        store = JobStore.from_config(configdata)
+        for job in (store.jobs() if store else []):
+            print(json.dumps(job))
+        return 0
+
+    scroll_count = args.scrolls if args.scrolls is not None else int(configdata.get("defaultScrolls", 5))
+    filters = {'class': args.class_filter, 'id': args.id_filter, 'src': args.src_filter,
+               'src_pattern': args.src_pattern, 'selector': args.selector,
+               'min_width': args.min_width, 'min_height': args.min_height, 'min_bytes': args.min_bytes}
+    urls = read_urls(args.urls)
+
+    sink = None
+    if not args.no_download:
+        os.makedirs(args.output, exist_ok=True)
+        # Held for the whole run so pages downloaded one after another fill the same shards
+        sink = ShardWriter.from_config(configdata, args.output)
+
+    # With the static fast path, browsers start on first use so static URL lists never launch Chrome
+    pool = BrowserPool.from_config(configdata, size=args.browsers)
+    if not configdata.get("staticFastPath", True):
+        pool.warm()
+
+    manifest = sys.stdout if args.manifest == "-" else open(args.manifest, "a")
+    manifest_lock = threading.Lock()
+    failed_pages = 0
+
+    crawler = None
+    if args.crawl_depth:
+        crawl_session = make_session(pool.size)
+        # Seeds need a scheme like every other URL, "example.com" would have no host to stay on
+        crawler = Crawler.from_config(crawl_session, configdata, [normalize_url(url) for url in urls], args.crawl_depth,
+                                      scope=args.scope, max_pages=args.max_pages)
+
+    def run(url, depth=0):
+        results, ok, links = scrape_page(pool, configdata, url, args, scroll_count, filters)
+        if crawler:
+            crawler.add_links(links, depth)
+        with manifest_lock:
+            for result in results:
+                result.pop('headers', None)
+                manifest.write(json.dumps(result) + "\n")
+            manifest.flush()
+        return ok
+
+    def crawl_worker():
+        # Each worker takes the next page the frontier allows until the crawl runs dry
+        failed = 0
+        while True:
+            page = crawler.next_page()
+            if page is None:
+                return failed
+            try:
+                failed += 0 if run(*page) else 1
+            finally:
+                crawler.page_done()
+
+    try:
+        with ThreadPoolExecutor(max_workers=pool.size) as executor:
+            if crawler:
+                failed_pages = sum(executor.map(lambda _: crawl_worker(), range(pool.size)))
+            else:
+                failed_pages = sum(1 for ok in executor.map(run, urls) if not ok)
+
+    finally:
+        pool.close()
+        if sink:
+            sink.release()
+        transcoder = Transcoder.from_config(configdata)
+        if transcoder:
+            transcoder.shutdown()
+        if crawler:
+            crawler.close()
+            crawl_session.close()
+        if manifest is not sys.stdout:
+            manifest.close()
+
+    return 1 if failed_pages else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
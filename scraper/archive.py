@@ -0,0 +1,144 @@
+import io
+import json
+import os
+import re
+import tarfile
+import threading
+import time
+import zipfile
+
+from .shared import SharedInstances
+
+ARCHIVE_FORMATS = ("tar", "zip")
+# Item fields that describe the scrape, not the media, and stay out of the sidecar
+PRIVATE_FIELDS = ('image', 'headers')
+
+def item_metadata(item, **fields):
+    # The JSON sidecar stored next to each item: everything the scrape knew about it
+    metadata = {key: value for key, value in item.items() if key not in PRIVATE_FIELDS}
+    metadata.update(fields)
+    return metadata
+
+class ShardWriter(SharedInstances):
+    # Appends downloaded items to rolling tar or zip shards (prefix-000000.tar, ...) instead of
+    # writing one file per item. Each item is stored WebDataset-style as {key}.{ext} followed
+    # by {key}.json with its metadata. A shard is closed and the next one started once it
+    # holds shardMaxItems items or the next item would take it past shardMaxBytes.
+    # The shard being written is named *.tmp until it is closed. Keys are the shard number and
+    # the item's place in it, so they never repeat, and content the writer already stored is
+    # recognized by its SHA-256 and not stored twice.
+
+    def __init__(self, directory, fmt="tar", prefix="shard", max_bytes=1024 ** 3, max_items=10000):
+        self.directory = directory
+        self.format = fmt
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.lock = threading.Lock()
+        self.users = 0
+        os.makedirs(directory, exist_ok=True)
+        self.archive = None
+        self.path = None
+        self.items = 0
+        self.bytes = 0
+        self.number = self.next_number()
+        # sha256 -> (member, shard path) of every item this writer stored
+        self.members = {}
+
+    @classmethod
+    def from_config(cls, configdata, directory):
+        # The writer for directory, shared by every download into it until each user calls release();
+        # None when outputFormat is "files"
+        fmt = configdata.get("outputFormat", "files")
+        if fmt not in ARCHIVE_FORMATS:
+            return None
+
+        directory = os.path.abspath(directory)
+        with cls.shared_lock:
+            writer = cls.shared(directory, lambda: cls(directory, fmt, configdata.get("shardPrefix", "shard"),
+                                                       configdata.get("shardMaxBytes", 1024 ** 3),
+                                                       configdata.get("shardMaxItems", 10000)))
+            writer.users += 1
+            return writer
+
+    def release(self):
+        # The last user closes the current shard, so it is complete on disk
+        with self.shared_lock:
+            self.users -= 1
+            if self.users > 0:
+                return
+            self.shared_instances.pop(self.directory, None)
+        self.close()
+
+    def next_number(self):
+        # Continues after the shards of earlier runs instead of overwriting them
+        pattern = re.compile(rf"{re.escape(self.prefix)}-(\d+)\.{self.format}(?:\.tmp)?$")
+        numbers = [int(match.group(1)) for match in map(pattern.match, os.listdir(self.directory)) if match]
+        return max(numbers) + 1 if numbers else 0
+
+    def shard_path(self):
+        return os.path.join(self.directory, f"{self.prefix}-{self.number:06d}.{self.format}")
+
+    def open_shard(self):
+        self.path = self.shard_path()
+        temp_path = self.path + ".tmp"
+        if self.format == "tar":
+            self.archive = tarfile.open(temp_path, "w", format=tarfile.PAX_FORMAT)
+        else:
+            # Media is already compressed, deflating it again only costs time
+            self.archive = zipfile.ZipFile(temp_path, "w", zipfile.ZIP_STORED, allowZip64=True)
+        self.items = 0
+        self.bytes = 0
+
+    def close_shard(self):
+        if self.archive is None:
+            return
+        self.archive.close()
+        os.replace(self.path + ".tmp", self.path)
+        self.archive = None
+        self.number += 1
+
+    def write_member(self, name, source, size):
+        # source is a file path or bytes
+        if self.format == "tar":
+            info = tarfile.TarInfo(name)
+            info.size = size
+            info.mtime = time.time()
+            info.mode = 0o644
+            if isinstance(source, bytes):
+                self.archive.addfile(info, io.BytesIO(source))
+            else:
+                with open(source, "rb") as f:
+                    self.archive.addfile(info, f)
+        elif isinstance(source, bytes):
+            self.archive.writestr(name, source)
+        else:
+            self.archive.write(source, name)
+
+    def add(self, sha256, files, metadata):
+        # Appends each (extension, path) in files as {key}{extension}, then the sidecar with the key
+        # added. Returns (member, shard's final path, added) for the first file; when sha256 is
+        # already in one of this writer's shards nothing is written and added is False.
+        sizes = [os.path.getsize(path) for _, path in files]
+        size = sum(sizes)
+        with self.lock:
+            if sha256 in self.members:
+                return self.members[sha256] + (False,)
+            if self.archive is not None and self.items and \
+                    (self.items >= self.max_items or self.bytes + size > self.max_bytes):
+                self.close_shard()
+            if self.archive is None:
+                self.open_shard()
+            key = f"{self.number:06d}-{self.items:06d}"
+            sidecar = json.dumps(dict(metadata, key=key), default=str, ensure_ascii=False).encode("utf-8")
+            for (extension, path), file_size in zip(files, sizes):
+                self.write_member(key + extension, path, file_size)
+            self.write_member(key + ".json", sidecar, len(sidecar))
+            self.items += 1
+            self.bytes += size + len(sidecar)
+            self.members[sha256] = (key + files[0][0], self.path)
+            return self.members[sha256] + (True,)
+
+    def close(self):
+        with self.lock:
+            self.close_shard()
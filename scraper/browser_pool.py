@@ -0,0 +1,219 @@
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# selenium and webdriver_manager take a good fraction of a second to import, so they are
+# imported where a browser is actually started, not with the package
+
+HEAP_SIZE_SCRIPT = "return (performance.memory && performance.memory.usedJSHeapSize) || 0;"
+DRIVER_CACHE_FILE = "data/chromedriver.json"
+
+def read_driver_cache(cache_path):
+    try:
+        with open(cache_path, "r") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return cached if os.path.exists(cached.get('path', "")) else None
+
+def chromedriver_path(configdata=None, refresh=False):
+    # ChromeDriverManager checks for the latest version over the network on every call, so
+    # its answer is remembered in chromedriverCachePath and only re-checked every
+    # chromedriverCheckDays. In offline mode the network is never asked. Returns None to
+    # let Selenium find a driver itself (on PATH or in its own cache).
+    configdata = configdata or {}
+    if configdata.get("chromedriverPath"):
+        return configdata["chromedriverPath"]
+
+    cache_path = configdata.get("chromedriverCachePath", DRIVER_CACHE_FILE)
+    cached = read_driver_cache(cache_path)
+    offline = configdata.get("offline", False)
+    max_age = configdata.get("chromedriverCheckDays", 7) * 86400
+    if cached and (offline or (not refresh and time.time() - cached.get('resolved', 0) < max_age)):
+        return cached['path']
+    if offline:
+        return shutil.which("chromedriver")
+
+    try:
+        from webdriver_manager.chrome import ChromeDriverManager
+        path = ChromeDriverManager().install()
+    except Exception as e:
+        print(f"Could not check for a chromedriver update ({e}), using the last known driver")
+        return cached['path'] if cached else shutil.which("chromedriver")
+
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        with open(cache_path, "w") as f:
+            json.dump({'path': path, 'resolved': time.time()}, f)
+    except OSError as e:
+        print(f"Failed to remember the chromedriver path: {e}")
+    return path
+
+def create_driver(configdata=None):
+    from selenium import webdriver
+    from selenium.common.exceptions import SessionNotCreatedException
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+
+    configdata = configdata or {}
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--window-size=1920,1080")
+
+    # Enable CDP logging
+    chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+    path = chromedriver_path(configdata)
+    try:
+        return webdriver.Chrome(service=Service(path) if path else Service(), options=chrome_options)
+    except SessionNotCreatedException:
+        # Usually a remembered driver that no longer matches an updated Chrome
+        if not path or configdata.get("offline") or configdata.get("chromedriverPath"):
+            raise
+        path = chromedriver_path(configdata, refresh=True)
+        return webdriver.Chrome(service=Service(path) if path else Service(), options=chrome_options)
+
+class PooledBrowser:
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages = 0
+        self.broken = False
+
+    def is_healthy(self):
+        try:
+            return self.driver.execute_script("return 1;") == 1
+        except Exception:
+            return False
+
+    def heap_mb(self):
+        try:
+            return (self.driver.execute_script(HEAP_SIZE_SCRIPT) or 0) / (1024 * 1024)
+        except Exception:
+            return 0
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            print(f"Error closing browser: {e}")
+
+class BrowserPool:
+    # A fixed number of Chrome slots. Slots hold a PooledBrowser, or None when the
+    # browser has not been started yet or was thrown away and must be respawned.
+    def __init__(self, size=2, recycle_after=50, max_heap_mb=1024, factory=create_driver):
+        self.size = max(1, int(size))
+        self.recycle_after = max(1, int(recycle_after))
+        self.max_heap_mb = max_heap_mb
+        self.factory = factory
+        self.idle = queue.Queue()
+        self.leased = set()
+        self.lock = threading.Lock()
+        self.closed = False
+        for _ in range(self.size):
+            self.idle.put(None)
+
+    @classmethod
+    def from_config(cls, configdata, size=None):
+        return cls(
+            size=size or configdata.get("browserPoolSize", 2),
+            recycle_after=configdata.get("browserRecycleAfter", 50),
+            max_heap_mb=configdata.get("browserMaxHeapMB", 1024),
+            factory=lambda: create_driver(configdata),
+        )
+
+    def warm(self):
+        # Start every empty slot in parallel so the first pages don't pay for Chrome startup
+        slots = []
+        while True:
+            try:
+                slots.append(self.idle.get_nowait())
+            except queue.Empty:
+                break
+
+        def start(slot):
+            try:
+                return self.ensure(slot)
+            except Exception as e:
+                print(f"Error starting browser: {e}")
+                return None
+
+        with ThreadPoolExecutor(max_workers=max(1, len(slots))) as executor:
+            for browser in executor.map(start, slots):
+                self.idle.put(browser)
+
+    def ensure(self, browser):
+        if browser is not None and browser.is_healthy():
+            return browser
+        if browser is not None:
+            print("Replacing unresponsive browser")
+            browser.quit()
+        return PooledBrowser(self.factory())
+
+    @contextmanager
+    def lease(self):
+        from selenium.common.exceptions import WebDriverException
+
+        if self.closed:
+            raise RuntimeError("Browser pool is closed")
+
+        slot = self.idle.get()
+        try:
+            browser = self.ensure(slot)
+        except Exception:
+            self.idle.put(None)  # Give the slot back so the pool keeps its size
+            raise
+
+        with self.lock:
+            self.leased.add(browser)
+        try:
+            yield browser.driver
+        except WebDriverException:
+            browser.broken = True
+            raise
+        finally:
+            browser.pages += 1
+            with self.lock:
+                self.leased.discard(browser)
+            self.release(browser)
+
+    def release(self, browser):
+        if self.closed:
+            browser.quit()
+            return
+
+        if browser.broken or browser.pages >= self.recycle_after or browser.heap_mb() > self.max_heap_mb:
+            # Respawned lazily on the next lease
+            browser.quit()
+            self.idle.put(None)
+            return
+
+        try:
+            # Drop the page so its memory is freed while the browser sits idle
+            browser.driver.get("about:blank")
+        except Exception:
+            browser.quit()
+            self.idle.put(None)
+            return
+        self.idle.put(browser)
+
+    def close(self):
+        self.closed = True
+        while True:
+            try:
+                browser = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            if browser is not None:
+                browser.quit()
+        with self.lock:
+            leased = list(self.leased)
+        for browser in leased:
+            browser.quit()
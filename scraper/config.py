@@ -0,0 +1,13 @@
+import json
+
+CONFIG_FILE = "data/config.json"
+
+def load_config(path=CONFIG_FILE):
+    with open(path, "r") as file:
+        return json.load(file)
+
+def get_max_workers(configdata):
+    try:
+        return max(1, int(configdata.get("max_workers", 20)))
+    except (TypeError, ValueError):
+        return 20
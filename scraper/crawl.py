@@ -0,0 +1,264 @@
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.robotparser
+
+from .net import USER_AGENT
+
+# Links to files rather than pages are never crawled
+NON_PAGE_EXTENSIONS = re.compile(
+    r"\.(?:jpe?g|png|gif|webp|avif|bmp|svg|ico|mp4|webm|mov|m4v|mkv|avi|mp3|wav|ogg|pdf|zip|rar|7z|gz|tar|exe|dmg|css|js|json|xml|woff2?|ttf)$",
+    re.IGNORECASE,
+)
+
+FRONTIER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS frontier (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    host TEXT NOT NULL,
+    depth INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS frontier_host ON frontier (host, id);
+"""
+
+class BloomFilter:
+    # Fixed-size visited set: a URL is never reported unseen once added, and an unseen URL is
+    # mistaken for a visited one with probability error_rate while under capacity
+    def __init__(self, capacity, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.lock = threading.Lock()
+
+    def positions(self, item):
+        # Double hashing over one digest instead of k separate hash functions
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        # Returns True if item was not (probably) in the set before
+        added = False
+        with self.lock:
+            for position in self.positions(item):
+                byte, bit = divmod(position, 8)
+                if not self.bits[byte] & (1 << bit):
+                    self.bits[byte] |= 1 << bit
+                    added = True
+        return added
+
+    def __contains__(self, item):
+        with self.lock:
+            return all(self.bits[position // 8] & (1 << (position % 8)) for position in self.positions(item))
+
+def normalize_link(url):
+    # Comparable form of a link: no fragment, lowercase scheme and host, default path
+    parsed = urllib.parse.urlsplit(url)
+    if parsed.scheme not in ("http", "https"):
+        return None
+    return urllib.parse.urlunsplit((parsed.scheme, parsed.netloc.lower(), parsed.path or "/", parsed.query, ""))
+
+def registrable_domain(host):
+    # Close enough without a public suffix list: the last two labels
+    host = host.split(":")[0]
+    return ".".join(host.split(".")[-2:])
+
+class Robots:
+    # robots.txt per host, fetched once through the crawl session
+    def __init__(self, session, user_agent=USER_AGENT):
+        self.session = session
+        self.user_agent = user_agent
+        self.parsers = {}
+        self.lock = threading.Lock()
+        self.host_locks = {}
+
+    def parser(self, url):
+        parsed = urllib.parse.urlsplit(url)
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        with self.lock:
+            if origin in self.parsers:
+                return self.parsers[origin]
+            host_lock = self.host_locks.setdefault(origin, threading.Lock())
+
+        with host_lock:
+            with self.lock:
+                if origin in self.parsers:
+                    return self.parsers[origin]
+            parser = urllib.robotparser.RobotFileParser(origin + "/robots.txt")
+            try:
+                response = self.session.get(origin + "/robots.txt", timeout=10)
+                if response.status_code in (401, 403):
+                    parser.disallow_all = True
+                elif response.ok:
+                    parser.parse(response.text.splitlines())
+                else:
+                    parser.allow_all = True
+            except Exception as e:
+                print(f"Failed to fetch robots.txt for {origin}: {e}")
+                parser.allow_all = True
+            with self.lock:
+                self.parsers[origin] = parser
+            return parser
+
+    def allowed(self, url):
+        return self.parser(url).can_fetch(self.user_agent, url)
+
+    def delay(self, url):
+        return self.parser(url).crawl_delay(self.user_agent) or 0
+
+class Crawler:
+    # Breadth-first frontier shared by any number of page workers. Pending URLs live in a
+    # SQLite file and visited URLs in a Bloom filter, so memory stays flat on huge sites.
+    # Each host gets at most one page start per crawlDelay (or its robots.txt Crawl-delay).
+    def __init__(self, session, start_urls, max_depth, scope="host", max_pages=1000, delay=1.0,
+                 respect_robots=True, include=None, exclude=None, bloom_capacity=2000000,
+                 bloom_error_rate=0.001, frontier_path=None):
+        self.max_depth = max_depth
+        self.scope = scope
+        self.max_pages = max_pages
+        self.delay = delay
+        self.robots = Robots(session) if respect_robots else None
+        self.include = re.compile(include) if include else None
+        self.exclude = re.compile(exclude) if exclude else None
+        self.visited = BloomFilter(bloom_capacity, bloom_error_rate)
+
+        self.owns_frontier = frontier_path is None
+        if frontier_path is None:
+            handle, frontier_path = tempfile.mkstemp(prefix="scraper-frontier-", suffix=".sqlite3")
+            os.close(handle)
+        self.frontier_path = frontier_path
+        self.db = sqlite3.connect(frontier_path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=OFF")
+        self.db.executescript(FRONTIER_SCHEMA)
+
+        self.condition = threading.Condition()
+        self.next_start = {}  # host -> monotonic time its next page may start
+        self.in_flight = 0
+        self.started = 0
+        self.starts = [urllib.parse.urlsplit(url) for url in start_urls]
+
+        for url in start_urls:
+            self.push(url, 0)
+
+    @classmethod
+    def from_config(cls, session, configdata, start_urls, max_depth, **overrides):
+        options = {
+            'scope': configdata.get("crawlScope", "host"),
+            'max_pages': configdata.get("crawlMaxPages", 1000),
+            'delay': configdata.get("crawlDelay", 1.0),
+            'respect_robots': configdata.get("crawlRespectRobots", True),
+            'include': configdata.get("crawlInclude"),
+            'exclude': configdata.get("crawlExclude"),
+            'bloom_capacity': configdata.get("crawlBloomCapacity", 2000000),
+            'frontier_path': configdata.get("crawlFrontierPath"),
+        }
+        options.update((key, value) for key, value in overrides.items() if value is not None)
+        return cls(session, start_urls, max_depth, **options)
+
+    def in_scope(self, url):
+        parsed = urllib.parse.urlsplit(url)
+        if NON_PAGE_EXTENSIONS.search(parsed.path):
+            return False
+        if self.exclude and self.exclude.search(url):
+            return False
+        if self.include and not self.include.search(url):
+            return False
+        if self.scope == "any":
+            return True
+        for start in self.starts:
+            if self.scope == "host" and parsed.netloc == start.netloc.lower():
+                return True
+            if self.scope == "domain" and registrable_domain(parsed.netloc) == registrable_domain(start.netloc.lower()):
+                return True
+            if self.scope == "prefix" and parsed.netloc == start.netloc.lower() \
+                    and parsed.path.startswith(start.path.rsplit("/", 1)[0] + "/"):
+                return True
+        return False
+
+    def push(self, url, depth):
+        url = normalize_link(url)
+        if not url or not self.visited.add(url):
+            return False
+        with self.condition:
+            self.db.execute("INSERT INTO frontier (url, host, depth) VALUES (?, ?, ?)",
+                            (url, urllib.parse.urlsplit(url).netloc, depth))
+            self.condition.notify()
+        return True
+
+    def add_links(self, links, depth):
+        # Links found on a page at depth; anything past max_depth or out of scope is dropped
+        if depth >= self.max_depth:
+            return 0
+        added = 0
+        for link in links:
+            link = normalize_link(link)
+            if link and self.in_scope(link) and self.push(link, depth + 1):
+                added += 1
+        with self.condition:
+            self.db.commit()
+        return added
+
+    def next_page(self):
+        # Blocks until a page may be fetched, returns (url, depth), or None once the crawl is over
+        while True:
+            with self.condition:
+                row = None
+                while row is None:
+                    if self.started >= self.max_pages:
+                        return None
+                    now = time.monotonic()
+                    waiting = [host for host, when in self.next_start.items() if when > now]
+                    row = self.db.execute(
+                        f"SELECT id, url, host, depth FROM frontier WHERE host NOT IN ({','.join('?' * len(waiting))}) "
+                        "ORDER BY id LIMIT 1", waiting).fetchone()
+                    if row is not None:
+                        break
+                    if self.in_flight == 0 and not self.db.execute("SELECT 1 FROM frontier LIMIT 1").fetchone():
+                        self.condition.notify_all()
+                        return None
+                    # Everything left belongs to hosts that are resting, or pages still running may add more
+                    soonest = min((when for when in self.next_start.values() if when > now), default=now + 1)
+                    self.condition.wait(min(max(soonest - now, 0.01), 1))
+
+                row_id, url, host, depth = row
+                self.db.execute("DELETE FROM frontier WHERE id = ?", (row_id,))
+                # Held back until robots.txt says how long this host wants between pages
+                self.next_start[host] = float("inf")
+                self.in_flight += 1
+
+            delay = self.delay
+            allowed = True
+            if self.robots:
+                allowed = self.robots.allowed(url)
+                delay = max(delay, self.robots.delay(url))
+
+            with self.condition:
+                self.next_start[host] = time.monotonic() + (delay if allowed else 0)
+                if allowed:
+                    self.started += 1
+                    return url, depth
+                self.in_flight -= 1
+                self.condition.notify_all()
+            print(f"Skipping {url}: disallowed by robots.txt")
+
+    def page_done(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def close(self):
+        self.db.close()
+        if self.owns_frontier:
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.remove(self.frontier_path + suffix)
+                except FileNotFoundError:
+                    pass
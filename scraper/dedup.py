@@ -0,0 +1,157 @@
+import os
+import sqlite3
+import threading
+
+from .shared import SharedInstances
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    sha256 TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    dhash INTEGER
+);
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    sha256 TEXT NOT NULL
+);
+"""
+
+def dhash(path, hash_size=8):
+    # 64-bit difference hash: survives resizing, recompression and small edits
+    from PIL import Image  # Deferred, so importing the package stays fast
+
+    try:
+        with Image.open(path) as image:
+            image.draft("L", (hash_size * 4, hash_size * 4))
+            pixels = list(image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR).getdata())
+    except Exception:
+        return None
+
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def hamming(a, b):
+    return bin((a ^ b) & ((1 << 64) - 1)).count("1")
+
+class BKTree:
+    # Metric tree over Hamming distance, near-duplicate lookups only visit a few branches
+    def __init__(self):
+        self.root = None
+
+    def add(self, key, value):
+        if self.root is None:
+            self.root = (key, value, {})
+            return
+        node = self.root
+        while True:
+            distance = hamming(key, node[0])
+            if distance == 0:
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (key, value, {})
+                return
+            node = child
+
+    def find(self, key, max_distance):
+        # Closest (distance, value) within max_distance, or None
+        best = None
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(key, node[0])
+            if distance <= max_distance and (best is None or distance < best[0]):
+                best = (distance, node[1])
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return best
+
+class DedupIndex(SharedInstances):
+    # Remembers every downloaded file by SHA-256 (and dHash for images) across runs
+
+    def __init__(self, path, max_distance=4, perceptual=False):
+        self.max_distance = max_distance
+        self.perceptual = perceptual
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+
+        # Built from every stored dHash on the first near-duplicate lookup, not when the app starts
+        self.tree = None
+
+    @classmethod
+    def from_config(cls, configdata):
+        if configdata.get("dedupMode", "skip") == "off":
+            return None
+
+        path = os.path.abspath(configdata.get("dedupIndexPath", "data/dedup.sqlite3"))
+        return cls.shared(path, lambda: cls(path, configdata.get("dedupMaxDistance", 4), configdata.get("dedupPerceptual", False)))
+
+    def existing_path(self, sha256):
+        with self.lock:
+            row = self.db.execute("SELECT path FROM files WHERE sha256 = ?", (sha256,)).fetchone()
+        if row and os.path.exists(row[0]):
+            return row[0]
+        return None
+
+    def path_for_url(self, url):
+        # A URL downloaded in an earlier run whose file is still on disk
+        with self.lock:
+            row = self.db.execute("SELECT sha256 FROM urls WHERE url = ?", (url,)).fetchone()
+        return self.existing_path(row[0]) if row else None
+
+    def find_duplicate(self, url, path, sha256, is_image):
+        # Returns (existing_path, kind, dhash) where kind is 'exact', 'similar' or None
+        existing = self.existing_path(sha256)
+        if existing:
+            self.remember_url(url, sha256)
+            return existing, 'exact', None
+
+        value = dhash(path) if is_image and self.perceptual else None
+        if value is not None:
+            with self.lock:
+                match = self.load_tree().find(value, self.max_distance)
+            if match:
+                existing = self.existing_path(match[1])
+                if existing:
+                    return existing, 'similar', value
+        return None, None, value
+
+    def add(self, url, sha256, path, size, value=None):
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO files (sha256, path, size, dhash) VALUES (?, ?, ?, ?)",
+                            (sha256, os.path.abspath(path), size, value))
+            self.db.execute("INSERT OR REPLACE INTO urls (url, sha256) VALUES (?, ?)", (url, sha256))
+            self.db.commit()
+            if value is not None and self.tree is not None:
+                self.tree.add(value, sha256)
+
+    def load_tree(self):
+        # Called with self.lock held
+        if self.tree is None:
+            self.tree = BKTree()
+            for sha256, value in self.db.execute("SELECT sha256, dhash FROM files WHERE dhash IS NOT NULL"):
+                self.tree.add(value, sha256)
+        return self.tree
+
+    def remember_url(self, url, sha256):
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO urls (url, sha256) VALUES (?, ?)", (url, sha256))
+            self.db.commit()
+
+def link_file(existing, filepath):
+    # Hard link when possible, then symlink, so a duplicate takes no extra space
+    try:
+        os.link(existing, filepath)
+    except OSError:
+        os.symlink(os.path.abspath(existing), filepath)
@@ -0,0 +1,302 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+import urllib.parse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .archive import item_metadata
+from .dedup import link_file
+from .metrics import metrics
+from .net import request_headers
+from .rate_limit import HostRateController
+from .transfer import clear_state, download_to_part, file_sha256, finish_part
+
+# Weight of the latest tick in the smoothed current throughput
+RATE_SMOOTHING = 0.3
+
+class DownloadStats:
+    # Progress event bus for one download batch. Workers publish from any thread with a
+    # deque append, which is atomic and takes no lock, and never touch the UI. A single
+    # consumer (the Tk tick, or the caller once the batch is done) folds the events into
+    # totals, throughput and ETA in snapshot(). Whoever runs the batch calls close() when it
+    # ends, with the error that stopped it early if any, so the consumer always sees the end.
+    def __init__(self, total):
+        self.total = total
+        self.events = deque()
+        self.downloaded = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+        self.last_tick = self.started
+        self.last_bytes = 0
+        self.current_rate = None
+        self.closed = False
+        self.error = None
+
+    def add_bytes(self, count):
+        self.events.append(('bytes', count))
+
+    def finish(self, outcome):
+        self.events.append((outcome, 1))
+
+    def close(self, error=None):
+        self.events.append(('closed', error))
+
+    def drain(self):
+        while True:
+            try:
+                kind, value = self.events.popleft()
+            except IndexError:
+                return
+            if kind == 'closed':
+                self.closed, self.error = True, value
+            else:
+                setattr(self, kind, getattr(self, kind) + value)
+
+    def snapshot(self):
+        self.drain()
+        now = time.monotonic()
+        finished = self.downloaded + self.skipped + self.failed
+        elapsed = max(now - self.started, 1e-6)
+
+        interval = now - self.last_tick
+        if interval >= 0.05:
+            rate = (self.bytes - self.last_bytes) / interval
+            if self.current_rate is None:
+                self.current_rate = rate
+            else:
+                self.current_rate = RATE_SMOOTHING * rate + (1 - RATE_SMOOTHING) * self.current_rate
+            self.last_tick, self.last_bytes = now, self.bytes
+
+        files_per_sec = finished / elapsed
+        return {
+            'total': self.total,
+            'finished': finished,
+            'downloaded': self.downloaded,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'mb': self.bytes / (1024 * 1024),
+            'elapsed': elapsed,
+            'files_per_sec': files_per_sec,
+            'mb_per_sec': self.bytes / (1024 * 1024) / elapsed,
+            'current_mb_per_sec': (self.current_rate or 0) / (1024 * 1024),
+            # Remaining files at the average pace so far, None until the first one finishes
+            'eta': (self.total - finished) / files_per_sec if finished else None,
+            'done': self.closed or finished >= self.total,
+            'error': self.error,
+        }
+
+def media_filename(idx, item):
+    filename = os.path.basename(urllib.parse.urlparse(item['src']).path)
+    if not filename or filename.isspace():
+        filename = f"media_{idx}.{'mp4' if item['type'] == 'video' else 'jpg'}"
+    return filename
+
+def download_items(session, items, download_path, configdata, stats, headers_for, page_url, max_workers, body_source=None, cache=None, dedup=None, on_result=None, sink=None, transcoder=None, rate=None):
+    # items is a list of (index, media item) pairs, returns one result dict per item.
+    # headers_for(kind, url) gives the reference headers for one item.
+    # body_source(url) may return (bytes, mime_type) already held by the browser to skip the request,
+    # cache is an optional HttpCache consulted before and filled after each transfer,
+    # dedup is an optional DedupIndex that catches files already downloaded under another name,
+    # on_result(result) is called from the worker as soon as each item is finished,
+    # sink is an optional ShardWriter that takes finished items instead of download_path,
+    # transcoder an optional Transcoder that re-encodes images before they are stored,
+    # and rate the HostRateController pacing and retrying requests per host.
+    # Links into a shard aren't possible, so a sink always settles duplicates by skipping them.
+    dedup_link = configdata.get("dedupMode", "skip") == "link" and sink is None
+    rate = rate or HostRateController.from_config(configdata)
+    download_root = os.path.join(os.path.abspath(download_path), "")
+    reserved_paths = set()
+    reserved_lock = threading.Lock()
+
+    def settles(existing):
+        # A link makes any earlier copy show up here, but skipping only leaves this folder
+        # complete when the copy is already in it
+        return existing and (dedup_link or os.path.abspath(existing).startswith(download_root))
+
+    def reserve_filepath(filepath):
+        # Workers run concurrently, so a name is claimed before any bytes are written
+        with reserved_lock:
+            base, ext = os.path.splitext(filepath)
+            counter = 1
+            while os.path.exists(filepath) or filepath in reserved_paths:
+                filepath = f"{base}_{counter}{ext}"
+                counter += 1
+            reserved_paths.add(filepath)
+            return filepath
+
+    def settle_duplicate(result, existing, filepath, kind):
+        # The bytes are already on disk under another name: link to them or leave it at that
+        if dedup_link:
+            # Named like what it points at, the index may hold a transcoded .webp for a .jpg download
+            extension = os.path.splitext(existing)[1]
+            if extension.lower() != os.path.splitext(filepath)[1].lower():
+                filepath = reserve_filepath(os.path.splitext(filepath)[0] + extension)
+            link_file(existing, filepath)
+            result.update(status='linked', path=filepath, duplicate_of=existing, duplicate=kind)
+        else:
+            print(f"Skipping {result['src']}: {kind} duplicate of {existing}")
+            result.update(status='duplicate', path=existing, duplicate=kind)
+        stats.finish('skipped')
+        return result
+
+    def complete(result, item, part_path, filepath, sha256, source=None):
+        # Moves a finished .part into place unless the index already holds the same content
+        if dedup:
+            existing, kind, value = dedup.find_duplicate(result['src'], part_path, sha256, item['type'] == 'image')
+            if settles(existing):
+                os.remove(part_path)
+                clear_state(part_path)
+                return settle_duplicate(result, existing, filepath, kind)
+
+        size = os.path.getsize(part_path)
+        # (part, final path) pairs to keep, the first one is what the result points at
+        outputs = [(part_path, filepath)]
+        if transcoder and item['type'] == 'image':
+            outputs = transcode(result, part_path, filepath)
+
+        if sink:
+            # Appended to the current shard and the .part dropped, no file of its own is left behind
+            files = [(os.path.splitext(path)[1].lower() or ('.mp4' if item['type'] == 'video' else '.jpg'), part)
+                     for part, path in outputs]
+            # A kept original is {key}.orig{ext}, it may share the transcoded file's extension
+            files[1:] = [(".orig" + extension, part) for extension, part in files[1:]]
+            # sha256 and bytes describe the member itself, the download's own go under original_*
+            fields = {'sha256': sha256, 'bytes': size}
+            if result.get('transcoded'):
+                fields = {'sha256': file_sha256(outputs[0][0]).hexdigest(), 'bytes': os.path.getsize(outputs[0][0]),
+                          'original_sha256': sha256, 'original_bytes': size}
+            metadata = item_metadata(item, filename=os.path.basename(filepath), source=source or 'network',
+                                     transcoded=result.get('transcoded'), **fields)
+            member, filepath, added = sink.add(sha256, files, metadata)
+            for part, _ in outputs:
+                clear_state(part)
+            result['member'] = member
+            if not added:
+                print(f"Skipping {result['src']}: exact duplicate of {member} in {filepath}")
+                result.update(status='duplicate', path=filepath, duplicate='exact')
+                stats.finish('skipped')
+                return result
+        else:
+            for part, path in outputs:
+                finish_part(part, path)
+            filepath = outputs[0][1]
+            if len(outputs) > 1:
+                result['original_path'] = outputs[1][1]
+        # A shard member has no path of its own to link to or find again, the writer tracks those
+        # sha256 is of the downloaded bytes, so the index points at the original when it was kept
+        if dedup and not sink:
+            dedup.add(result['src'], sha256, result.get('original_path', filepath), size, value)
+
+        stats.finish('downloaded')
+        result.update(status='downloaded', path=filepath, sha256=sha256)
+        if source:
+            result.update(bytes=size, source=source)
+        metrics.inc('scraper_bytes_total', result['bytes'], source=source or 'network')
+        return result
+
+    def transcode(result, part_path, filepath):
+        # Re-encodes the finished .part per transcodePolicies, returns the outputs for complete().
+        # Anything that goes wrong keeps the original as downloaded.
+        converted_part = part_path + ".transcoded"
+        try:
+            converted = transcoder.transcode(part_path, converted_part)
+        except Exception as e:
+            metrics.count_error('transcode', e)
+            print(f"Error transcoding {result['src']}: {e}")
+            clear_state(converted_part)
+            converted = None
+        if not converted:
+            return [(part_path, filepath)]
+
+        base, extension = os.path.splitext(filepath)
+        target = base + (converted['extension'] or extension)
+        keep_original = converted.pop('keep_original')
+        if keep_original or target != filepath:
+            target = reserve_filepath(target)
+        if not keep_original:
+            clear_state(part_path)
+        result['transcoded'] = converted
+        return [(converted_part, target)] + ([(part_path, filepath)] if keep_original else [])
+
+    def download_one(idx, item):
+        with metrics.span(f"{item['type']}_download", url=item['src']):
+            result = download_item(idx, item)
+        if on_result:
+            on_result(result)
+        return result
+
+    def download_item(idx, item):
+        media_url = item['src']
+        result = {'type': item['type'], 'src': media_url, 'status': 'failed', 'path': None, 'bytes': 0}
+        try:
+            filename = media_filename(idx, item)
+            filepath = os.path.join(download_path, filename)
+
+            # Check if the file already exists
+            if not sink and os.path.exists(filepath):
+                print(f"Skipping {filename}: File already exists")
+                stats.finish('skipped')
+                result.update(status='skipped', path=filepath)
+                return result
+
+            # The same URL fetched by an earlier run, saved under whatever name it got then
+            known = dedup.path_for_url(media_url) if dedup else None
+            if settles(known):
+                return settle_duplicate(result, known, reserve_filepath(filepath), 'exact')
+
+            # Claimed up front: the .part file next to it is how an interrupted download resumes
+            filepath = reserve_filepath(filepath)
+            part_path = filepath + ".part"
+
+            cached = body_source(media_url) if body_source else None
+            if cached:
+                with open(part_path, 'wb') as f:
+                    f.write(cached[0])
+                stats.add_bytes(len(cached[0]))
+                return complete(result, item, part_path, filepath, hashlib.sha256(cached[0]).hexdigest(), 'browser')
+
+            current_headers = request_headers(headers_for(item['type'], media_url), media_url, page_url)
+
+            cached_path = cache.validated_path(session, media_url, current_headers, rate=rate) if cache else None
+            if cached_path:
+                try:
+                    shutil.copyfile(cached_path, part_path)
+                except FileNotFoundError:
+                    # Evicted by another worker's store in the meantime, fetched like any other miss
+                    cached_path = None
+            if cached_path:
+                stats.add_bytes(os.path.getsize(part_path))
+                return complete(result, item, part_path, filepath, file_sha256(part_path).hexdigest(), 'cache')
+
+            result_lock = threading.Lock()
+
+            def on_bytes(count):
+                # Called from every segment thread of a segmented transfer
+                stats.add_bytes(count)
+                with result_lock:
+                    result['bytes'] += count
+
+            # Large videos are fetched as parallel byte ranges when the server allows it
+            response_headers, sha256 = download_to_part(session, media_url, current_headers, part_path, configdata,
+                                                        on_bytes, segmented=item['type'] == 'video', rate=rate)
+
+            if cache:
+                cache.store_file(media_url, part_path, response_headers, sha256)
+            complete(result, item, part_path, filepath, sha256)
+
+        except Exception as e:
+            metrics.count_error('download', e)
+            print(f"Error downloading {media_url}: {e}")
+            stats.finish('failed')
+            result['error'] = str(e)
+
+        return result
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(download_one, idx, item) for idx, item in items]
+    return [future.result() for future in futures]
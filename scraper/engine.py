@@ -0,0 +1,684 @@
+import json
+import os
+import queue
+import threading
+import time
+import urllib.parse
+
+import requests
+
+from .archive import ShardWriter
+from .browser_pool import create_driver
+from .config import get_max_workers
+from .crawl import Crawler
+from .dedup import DedupIndex
+from .download import DownloadStats, download_items
+from .media import blank_thumbnail
+from .media_filter import matches_filters, resolve_filters
+from .http_cache import HttpCache
+from .jobs import JobStore
+from .metrics import metrics
+from .network_log import NetworkCollector
+from .rate_limit import HostRateController
+from .net import USER_AGENT, fetch_image, make_session, normalize_url, origin_of, request_headers
+from .static_page import fetch_static_page
+from .thumbnailer import Thumbnailer
+from .transcode import Transcoder
+from .video_probe import VideoSizeProbe
+
+# Collects every img/video node in a single WebDriver round-trip, dropping the ones that fail
+# the filters (see media_filter.matches_filters) before they ever reach Python. Transfer sizes
+# come from the Resource Timing API; sizes the page doesn't know are 0 and always pass.
+EXTRACT_MEDIA_SCRIPT = """
+    const filters = arguments[0];
+    // Python-only syntax like (?P<name>...) doesn't compile here; matches_filters applies those afterwards
+    const pattern = (source) => {
+        if (!source) return null;
+        try {
+            return new RegExp(source, 'i');
+        } catch (e) {
+            return null;
+        }
+    };
+    const patterns = {
+        src: pattern(filters.src_pattern), alt: pattern(filters.alt_pattern), class: pattern(filters.class_pattern)
+    };
+    const within = (value, low, high) => (!low || value >= low) && (!high || value <= high);
+
+    const sizes = new Map();
+    for (const entry of performance.getEntriesByType('resource')) {
+        sizes.set(entry.name, entry.transferSize || entry.encodedBodySize || 0);
+    }
+
+    const keep = (el, item) => {
+        if (filters.selector && !el.closest(filters.selector)) return false;
+        if (filters.class && !item.class.includes(filters.class)) return false;
+        if (filters.id && !item.id.includes(filters.id)) return false;
+        if (filters.src && !item.src.includes(filters.src)) return false;
+        if (patterns.src && !patterns.src.test(item.src || item.source_src)) return false;
+        if (patterns.alt && !patterns.alt.test(item.alt)) return false;
+        if (patterns.class && !patterns.class.test(item.class)) return false;
+        const width = item.naturalWidth, height = item.naturalHeight;
+        if (width && height) {
+            if (!within(width, filters.min_width, filters.max_width)) return false;
+            if (!within(height, filters.min_height, filters.max_height)) return false;
+            if (!within(width / height, filters.min_aspect, filters.max_aspect)) return false;
+        }
+        if (item.tag === 'img' && item.transferSize && !within(item.transferSize, filters.min_bytes, filters.max_bytes)) {
+            return false;
+        }
+        return true;
+    };
+
+    const items = [];
+    let dropped = 0;
+    for (const el of document.querySelectorAll('img, video')) {
+        const tag = el.tagName.toLowerCase();
+        const source = tag === 'video' ? el.querySelector('source') : null;
+        const item = {
+            tag: tag,
+            // srcset and <picture> pick their own URL, the one Chrome actually fetched
+            src: el.currentSrc || el.src || '',
+            class: el.getAttribute('class') || '',
+            id: el.id || '',
+            alt: el.getAttribute('alt') || '',
+            poster: tag === 'video' ? (el.poster || '') : '',
+            source_src: source ? (source.src || '') : '',
+            naturalWidth: el.naturalWidth || el.videoWidth || 0,
+            naturalHeight: el.naturalHeight || el.videoHeight || 0,
+            transferSize: sizes.get(el.currentSrc || el.src) || 0
+        };
+        if (keep(el, item)) {
+            items.push(item);
+        } else {
+            dropped++;
+        }
+    }
+    return JSON.stringify({items: items, dropped: dropped});
+"""
+
+# Link targets for crawl mode, including rel=next pagination
+PAGE_LINKS_SCRIPT = """
+    return Array.from(document.querySelectorAll('a[href], area[href], link[rel~="next"][href]'), el => el.href);
+"""
+
+# Installed once per page, tracks in-flight requests and the last time anything changed
+SCROLL_OBSERVER_SCRIPT = """
+    if (window.__scraperScroll) {
+        return;
+    }
+    const state = { inflight: 0, lastChange: performance.now() };
+    const touch = () => { state.lastChange = performance.now(); };
+
+    new MutationObserver(touch).observe(document, {
+        childList: true, subtree: true, attributes: true, attributeFilter: ['src', 'srcset']
+    });
+    new PerformanceObserver(touch).observe({ entryTypes: ['resource'] });
+    // Room for every image of a long scroll, the filters read transfer sizes from here
+    performance.setResourceTimingBufferSize(10000);
+
+    const originalFetch = window.fetch;
+    window.fetch = function() {
+        state.inflight++;
+        touch();
+        return originalFetch.apply(this, arguments).finally(() => { state.inflight--; touch(); });
+    };
+
+    const originalSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function() {
+        state.inflight++;
+        touch();
+        this.addEventListener('loadend', () => { state.inflight--; touch(); }, { once: true });
+        return originalSend.apply(this, arguments);
+    };
+
+    window.__scraperScroll = state;
+"""
+
+# Scrolls to the bottom and calls back once the page is idle or the step times out
+SCROLL_STEP_SCRIPT = """
+    const quietMs = arguments[0];
+    const timeoutMs = arguments[1];
+    const done = arguments[arguments.length - 1];
+    const state = window.__scraperScroll;
+    const started = performance.now();
+
+    window.scrollTo(0, document.body.scrollHeight);
+    state.lastChange = performance.now();
+
+    const pendingImages = () => Array.from(document.images).filter((img) => {
+        if (img.complete) {
+            return false;
+        }
+        const rect = img.getBoundingClientRect();
+        return rect.bottom > -window.innerHeight && rect.top < window.innerHeight * 2;
+    }).length;
+
+    const check = () => {
+        const now = performance.now();
+        const idle = state.inflight <= 0 && pendingImages() === 0 && now - state.lastChange >= quietMs;
+        if (idle || now - started >= timeoutMs) {
+            done({ height: document.body.scrollHeight, idle: idle });
+        } else {
+            setTimeout(check, 50);
+        }
+    };
+    setTimeout(check, 50);
+"""
+
+IMAGE_ACCEPT = 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8'
+VIDEO_ACCEPT = 'video/mp4,video/webm,video/ogg'
+
+class ScraperEngine:
+    # Browser-driven scraping with no UI dependency, shared by the Tk app and the CLI
+    # Pass a driver leased from a BrowserPool to scrape several pages in parallel
+    def __init__(self, configdata=None, on_status=None, driver=None):
+        self.configdata = configdata if configdata is not None else {}
+        metrics.configure(self.configdata)
+        self.on_status = on_status or print
+        self.driver = driver
+        self.owns_driver = False
+        # Chrome is started on first use, or ahead of time from a background thread as the window does
+        self.browser_lock = threading.Lock()
+        self.closed = False
+        # (elements, page_url, links) when the current page was loaded without the browser
+        self.static_page = None
+        # Records the media responses and request headers Chrome sent for the current browser page
+        self.network = None
+        # (origin, 'image'|'video') -> request headers Chrome used, kept across pages
+        self.header_profiles = {}
+        self.browser_user_agent = None
+        self.session = make_session(get_max_workers(self.configdata))
+        # Per-host pacing and retries, shared by thumbnails and downloads
+        self.rate = HostRateController.from_config(self.configdata)
+        self.cache = HttpCache.from_config(self.configdata)
+        self.thumbnailer = Thumbnailer.from_config(self.configdata)
+        # Shared like the thumbnailer, None unless transcodePolicies has an image policy
+        self.transcoder = Transcoder.from_config(self.configdata)
+        # Shared across engines using the same index file, None when dedupMode is off
+        self.dedup = DedupIndex.from_config(self.configdata)
+        # Persistent record of every scrape and download, None when jobStoreEnabled is false
+        self.jobs = JobStore.from_config(self.configdata)
+        # Job of the most recent stream_tiles run, which download() records into by default
+        self.job_id = None
+        # Video sizes by URL, kept for the engine's lifetime so re-scrapes don't re-probe
+        self.video_sizes = VideoSizeProbe.from_config(self.configdata)
+
+    def status(self, message):
+        self.on_status(message)
+
+    def start_browser(self):
+        self.driver = create_driver(self.configdata)
+        self.owns_driver = True
+
+    def ensure_browser(self):
+        # Starts Chrome unless it is running; a second caller waits for the first one's start
+        with self.browser_lock:
+            if self.driver is None and not self.closed:
+                self.start_browser()
+                if self.closed:
+                    # close() came while Chrome was starting
+                    self.driver.quit()
+                    self.driver = None
+            if self.driver is None:
+                raise RuntimeError("The scraper is closed")
+            return self.driver
+
+    def close(self):
+        self.closed = True
+        # Waits for a start in progress, which then quits its own Chrome in ensure_browser.
+        # Drivers leased from a BrowserPool are returned by the pool, not quit here.
+        with self.browser_lock:
+            if self.driver and self.owns_driver:
+                self.driver.quit()
+            self.driver = None
+        self.session.close()
+        self.video_sizes.close()
+
+    def load_page(self, url, scroll_count, filters=None):
+        url = normalize_url(url)
+
+        if self.load_static(url, filters):
+            return
+        self.load_browser_page(url, scroll_count)
+
+    def load_static(self, url, filters=None):
+        # Fast path for server-rendered pages, returns False when the browser is needed
+        self.static_page = None
+        self.network = None
+        if not self.configdata.get("staticFastPath", True):
+            return False
+        if resolve_filters(self.configdata, filters)['selector']:
+            # Only a real DOM can tell which elements a CSS selector covers
+            return False
+        url = normalize_url(url)
+
+        self.status("Loading page without browser...")
+        try:
+            headers = {
+                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+                'User-Agent': USER_AGENT,
+            }
+            with metrics.span('static_fetch', url=url):
+                self.static_page = fetch_static_page(self.session, url, headers, self.configdata.get("staticMinImages", 3))
+        except Exception as e:
+            print(f"Static fetch failed for {url}: {e}")
+
+        if self.static_page is None:
+            self.status("Page needs a browser, falling back to Chrome...")
+            return False
+        return True
+
+    def load_browser_page(self, url, scroll_count):
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        self.ensure_browser()
+        url = normalize_url(url)
+        self.static_page = None
+        self.network = None
+        # Always listening: the request headers it records replace any in-page probing
+        self.network = NetworkCollector(self.driver, harvest=self.configdata.get("harvestNetworkMedia", True))
+        self.network.reset()
+
+        self.status("Loading page...")
+        with metrics.span('driver_get', url=url):
+            self.driver.get(url)
+        with metrics.span('scroll_page', url=url, scrolls=scroll_count):
+            self.scroll_page(scroll_count)
+
+        with metrics.span('wait_for_images', url=url):
+            WebDriverWait(self.driver, 10).until(
+                EC.presence_of_element_located((By.TAG_NAME, "img"))
+            )
+
+        if self.network:
+            with metrics.span('network_log'):
+                self.network.poll()
+            self.header_profiles.update(self.network.header_profiles)
+
+    def scroll_page(self, scroll_count):
+        # Each step scrolls to the bottom and returns once the page has gone quiet:
+        # no fetch/XHR in flight, no visible image still loading and no DOM change for scrollQuietMs
+        quiet_ms = self.configdata.get("scrollQuietMs", 300)
+        step_timeout_ms = self.configdata.get("scrollStepTimeoutMs", 5000)
+        deadline = time.monotonic() + self.configdata.get("scrollMaxSeconds", 30)
+
+        self.driver.set_script_timeout(step_timeout_ms / 1000 + 5)
+        self.driver.execute_script(SCROLL_OBSERVER_SCRIPT)
+        last_height = self.driver.execute_script("return document.body.scrollHeight")
+
+        for i in range(int(scroll_count)):
+            self.status(f"Scrolling page... ({i+1}/{scroll_count})")
+
+            result = self.driver.execute_async_script(SCROLL_STEP_SCRIPT, quiet_ms, step_timeout_ms)
+            new_height = result['height']
+
+            if new_height == last_height and result['idle']:
+                self.status("Reached bottom of page")
+                break
+            if time.monotonic() >= deadline:
+                self.status("Scroll time budget used up")
+                break
+
+            last_height = new_height
+
+    def extract_media_elements(self, filters):
+        # filters is a resolve_filters() result; the browser applies it in the page
+        if self.static_page:
+            return self.static_page[0]
+
+        with metrics.span('extract'):
+            extracted = json.loads(self.driver.execute_script(EXTRACT_MEDIA_SCRIPT, filters) or "{}")
+        elements = extracted.get('items', [])
+        if extracted.get('dropped'):
+            self.status(f"Filtered out {extracted['dropped']} elements in the page")
+        if self.network:
+            self.network.poll()
+            known_urls = set()
+            for el in elements:
+                known_urls.update((el['src'], el['source_src'], el['poster']))
+                if not el['transferSize']:
+                    # Resource Timing hides sizes of cross-origin responses without Timing-Allow-Origin
+                    el['transferSize'] = self.network_details(el['src']).get('transfer_size') or 0
+            # Media outside the DOM can't be inside the selector's scope
+            if not filters['selector']:
+                elements.extend(self.network.extra_elements(known_urls))
+            self.header_profiles.update(self.network.header_profiles)
+        return elements
+
+    def page_links(self):
+        if self.static_page:
+            return self.static_page[2]
+        return self.driver.execute_script(PAGE_LINKS_SCRIPT) or []
+
+    def iter_pages(self, options):
+        # Loads the start page, or with crawl_depth every page of a crawl one after another,
+        # yielding each URL while it is the loaded page
+        depth = options.get('crawl_depth', 0)
+        if not depth:
+            with metrics.span('load_page', url=options['url']):
+                self.load_page(options['url'], options['scroll_count'], options['filters'])
+            yield options['url']
+            return
+
+        crawler = Crawler.from_config(self.session, self.configdata, [normalize_url(options['url'])], depth)
+        try:
+            while True:
+                page = crawler.next_page()
+                if page is None:
+                    break
+                url, page_depth = page
+                self.status(f"Crawling {url} (depth {page_depth}, {crawler.started} pages)...")
+                try:
+                    with metrics.span('load_page', url=url, depth=page_depth):
+                        self.load_page(url, options['scroll_count'], options['filters'])
+                    crawler.add_links(self.page_links(), page_depth)
+                except Exception as e:
+                    metrics.count_error('crawl', e)
+                    print(f"Error crawling {url}: {e}")
+                    crawler.page_done()
+                    continue
+                try:
+                    yield url
+                finally:
+                    crawler.page_done()
+        finally:
+            crawler.close()
+
+    def network_details(self, url):
+        # MIME type, status and transfer size Chrome saw for this URL, if any
+        record = self.network.responses.get(url) if self.network else None
+        if not record:
+            return {}
+        return {'mime_type': record['mime_type'], 'http_status': record['status'], 'transfer_size': record['size']}
+
+    def browser_body(self, url):
+        # (bytes, mime_type) for a response Chrome already holds, so it is not fetched twice
+        network = self.network
+        if network is None:
+            return None
+        return network.get_body(url)
+
+    def current_url(self):
+        if self.static_page:
+            return self.static_page[1]
+        return self.driver.current_url if self.driver else None
+
+    def fallback_headers(self, accept, page_url=None):
+        page_url = page_url or self.current_url()
+        in_browser = self.driver is not None and not self.static_page
+        if self.browser_user_agent is None and in_browser:
+            self.browser_user_agent = self.driver.execute_script('return navigator.userAgent;')
+        return {
+            'Accept': accept,
+            'Accept-Encoding': 'gzip, deflate, br',
+            'Connection': 'keep-alive',
+            'User-Agent': self.browser_user_agent if in_browser else USER_AGENT,
+            'Referer': page_url,
+            'Origin': origin_of(page_url),
+        }
+
+    def header_profile(self, kind, url, page_url=None):
+        # Headers Chrome itself sent for this kind of media to url's origin, captured passively
+        # from the network log. Falls back to the origin's other kind with Accept swapped,
+        # then to the page origin, then to synthesized headers.
+        accept = IMAGE_ACCEPT if kind == 'image' else VIDEO_ACCEPT
+        page_url = page_url or self.current_url()
+        if self.static_page or not page_url:
+            return self.fallback_headers(accept, page_url)
+
+        origins = (origin_of(url), origin_of(page_url))
+        for origin in origins:
+            profile = self.header_profiles.get((origin, kind))
+            if profile:
+                return dict(profile)
+        for origin in origins:
+            profile = self.header_profiles.get((origin, 'video' if kind == 'image' else 'image'))
+            if profile:
+                return dict(profile, Accept=accept)
+        return self.fallback_headers(accept, page_url)
+
+    def sync_cookies(self, session):
+        # Gives session the browser's cookies (or the static fetch's), so hotlink-protected
+        # hosts see the same client that loaded the page
+        if self.static_page:
+            session.cookies.update(self.session.cookies)
+            return
+        if not self.network:
+            return
+        try:
+            cookies = self.network.cookies()
+        except Exception as e:
+            print(f"Failed to read browser cookies: {e}")
+            return
+        for cookie in cookies:
+            session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain', ""),
+                                path=cookie.get('path', "/"), secure=cookie.get('secure', False))
+
+    def iter_media(self, media_type, filters):
+        # Yields one job per unique media URL on the loaded page, in document order
+        filters = resolve_filters(self.configdata, filters)
+        elements = self.extract_media_elements(filters)
+        page_url = self.current_url()
+        processed_urls = set()
+
+        if media_type in ["photos", "both"]:
+            images = [el for el in elements if el['tag'] == 'img' and matches_filters(el, filters)]
+            self.status(f"Processing {len(images)} images...")
+
+            for img in images:
+                img_src = img['src']
+                if not img_src or img_src.startswith('data:'):
+                    continue
+
+                img_src = urllib.parse.urljoin(page_url, img_src)
+                if img_src in processed_urls:
+                    continue
+                processed_urls.add(img_src)
+
+                yield dict(self.network_details(img_src), **{
+                    'type': 'image',
+                    'src': img_src,
+                    'page': page_url,
+                    'headers': request_headers(self.header_profile('image', img_src), img_src, page_url),
+                    'width': img['naturalWidth'],
+                    'height': img['naturalHeight'],
+                })
+
+        if media_type in ["videos", "both"]:
+            videos = [el for el in elements if el['tag'] == 'video' and matches_filters(el, filters)]
+            self.status(f"Processing {len(videos)} videos...")
+
+            jobs = []
+            for video in videos:
+                video_src = video['source_src'] or video['src']
+                if not video_src:
+                    continue
+
+                video_src = urllib.parse.urljoin(page_url, video_src)
+                if video_src in processed_urls:
+                    continue
+                processed_urls.add(video_src)
+
+                jobs.append(dict(self.network_details(video_src), **{
+                    'type': 'video',
+                    'src': video_src,
+                    'page': page_url,
+                    'poster': video['poster'],
+                    'width': video['naturalWidth'],
+                    'height': video['naturalHeight'],
+                }))
+
+            # Every size is probed at once instead of one round-trip per tile
+            self.video_sizes.prefetch([job['src'] for job in jobs], {'Referer': page_url})
+            yield from jobs
+
+    def stream_tiles(self, options, emit):
+        # Producer: the browser streams media jobs into a bounded queue.
+        # Consumers: a pool of workers fetches and decodes thumbnails and emits ('tile', tile).
+        # Always finishes with ('done', error_message_or_None).
+        max_workers = get_max_workers(self.configdata)
+        work_queue = queue.Queue(maxsize=max_workers * 4)
+        session = make_session(max_workers)
+
+        workers = [
+            threading.Thread(target=self.thumbnail_worker, args=(session, work_queue, emit, options), daemon=True)
+            for _ in range(max_workers)
+        ]
+        for worker in workers:
+            worker.start()
+
+        error_message = None
+        started = time.perf_counter()
+        self.job_id = self.jobs.create_job(options['url'], options) if self.jobs else None
+        try:
+            seen = set()
+            for _ in self.iter_pages(options):
+                self.sync_cookies(session)
+                for job in self.iter_media(options['media_type'], options['filters']):
+                    # Logos and such repeat on every page of a crawl
+                    if job['src'] in seen:
+                        continue
+                    seen.add(job['src'])
+                    if self.jobs:
+                        self.jobs.add_item(self.job_id, len(seen) - 1, job)
+                    # Blocks while the workers are busy, which keeps memory bounded on huge pages
+                    work_queue.put(job)
+
+        except Exception as e:
+            error_message = f"Error: {str(e)}"
+            metrics.count_error('fetch_media', e)
+
+        finally:
+            for _ in workers:
+                work_queue.put(None)
+            for worker in workers:
+                worker.join()
+            session.close()
+            if self.jobs:
+                self.jobs.set_job_status(self.job_id, 'failed' if error_message else 'discovered')
+            metrics.record('fetch_media', time.perf_counter() - started, url=options['url'], error=error_message)
+            metrics.flush()
+            emit('done', error_message)
+
+    def thumbnail_worker(self, session, work_queue, emit, options):
+        while True:
+            job = work_queue.get()
+            if job is None:
+                break
+
+            try:
+                with metrics.span(f"{job['type']}_tile", url=job['src']):
+                    if job['type'] == 'image':
+                        tile = self.load_image_tile(session, job, options)
+                    else:
+                        tile = self.load_video_tile(session, job)
+                if tile:
+                    emit('tile', tile)
+
+            except requests.exceptions.HTTPError as errh:
+                metrics.count_error('thumbnail', errh)
+                print(f"HTTP Error for {job['src']}: {errh}")
+                if errh.response is not None:
+                    print(f"Response status: {errh.response.status_code}")
+                    print("Response headers:")
+                    print(json.dumps(dict(errh.response.headers), indent=2))
+
+            except Exception as e:
+                metrics.count_error('thumbnail', e)
+                print(f"Error processing {job['type']} {job['src']}: {e}")
+
+    def load_image_tile(self, session, job, options):
+        if not options.get('load_images', True):
+            return dict(job, image=blank_thumbnail())
+
+        image = self.thumbnailer.cached('thumbnail', job['src'])
+        if image is not None:
+            return dict(job, image=image)
+
+        cached = self.browser_body(job['src'])
+        if cached and cached[1].startswith("image/"):
+            metrics.inc('scraper_cache_total', cache='browser', result='hit')
+            if self.cache:
+                # Keep it so a later download doesn't need the browser or the network
+                self.cache.store(job['src'], cached[0], {'Content-Type': cached[1]})
+            return dict(job, image=self.thumbnailer.thumbnail(job['src'], cached[0]))
+
+        if self.cache:
+            # Only a request that goes to the network takes a host slot
+            content, content_type = self.cache.fetch(session, job['src'], job['headers'], timeout=5, rate=self.rate)
+        else:
+            def fetch():
+                response = session.get(job['src'], headers=job['headers'], timeout=5)
+                response.raise_for_status()
+                return response.content, response.headers.get("Content-Type", "")
+            content, content_type = self.rate.call(job['src'], fetch)
+
+        if "image" not in content_type:
+            return None
+
+        return dict(job, image=self.thumbnailer.thumbnail(job['src'], content))
+
+    def load_video_tile(self, session, job):
+        video_size = self.video_sizes.size_mb(job['src'], {'Referer': job['page']})
+
+        poster_image = None
+        if job['poster']:
+            poster_image = self.thumbnailer.cached('poster', job['poster'])
+        if job['poster'] and poster_image is None:
+            try:
+                image_data = self.rate.call(job['poster'], lambda: fetch_image(session, job['poster'], job['page']))
+                poster_image = self.thumbnailer.poster(job['poster'], image_data)
+            except Exception as e:
+                print(f"Failed to load poster image: {e}")
+
+        return dict(job, image=poster_image, size=video_size)
+
+    def download(self, items, download_path, stats=None, job_id=None):
+        # items is a list of (index, media item) pairs taken from iter_media. Each result is
+        # recorded in job_id (default: the job of the last stream_tiles run) as soon as it is known.
+        if stats is None:
+            stats = DownloadStats(len(items))
+        if not items:
+            return []
+
+        job_id = job_id or self.job_id
+        on_result = None
+        if self.jobs and job_id:
+            self.jobs.queue_items(job_id, items)
+            self.jobs.set_job_status(job_id, 'downloading', os.path.abspath(download_path))
+            on_result = lambda result: self.jobs.record_result(job_id, result)
+
+        page_url = items[0][1].get('page') or self.current_url()
+        # Profiles are resolved up front, the download workers never touch the driver
+        profiles = {}
+        for _, item in items:
+            key = (item['type'], origin_of(item['src']))
+            if key not in profiles:
+                profiles[key] = self.header_profile(item['type'], item['src'], item.get('page'))
+
+        max_workers = get_max_workers(self.configdata)
+        # Room for the extra range connections of segmented video downloads
+        session = make_session(max_workers + self.configdata.get("downloadSegments", 4))
+        self.sync_cookies(session)
+        # None unless outputFormat asks for tar or zip shards
+        sink = ShardWriter.from_config(self.configdata, download_path)
+        try:
+            with metrics.span('download', items=len(items), page=page_url):
+                results = download_items(session, items, download_path, self.configdata, stats,
+                                         lambda kind, url: profiles[(kind, origin_of(url))], page_url, max_workers,
+                                         body_source=self.browser_body,
+                                         cache=self.cache, dedup=self.dedup, on_result=on_result, sink=sink,
+                                         transcoder=self.transcoder, rate=self.rate)
+        finally:
+            if sink:
+                sink.release()
+            session.close()
+            metrics.flush()
+
+        if on_result:
+            # Only reached when the batch ran to the end; a crash leaves the job 'downloading'
+            self.jobs.set_job_status(job_id, 'done')
+        return results
@@ -0,0 +1,304 @@
+import email.utils
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from .metrics import metrics
+from .shared import SharedInstances
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    url TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    content_type TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    expires REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest);
+"""
+
+def parse_expiry(headers, default_ttl):
+    # Returns the absolute expiry time, or None when the response must not be stored
+    cache_control = headers.get("Cache-Control", "").lower()
+    directives = [part.strip() for part in cache_control.split(",") if part.strip()]
+    if "no-store" in directives:
+        return None
+
+    now = time.time()
+    if "no-cache" in directives:
+        return now
+    for directive in directives:
+        if directive.startswith("max-age="):
+            try:
+                return now + int(directive.split("=", 1)[1])
+            except ValueError:
+                break
+
+    expires = headers.get("Expires")
+    if expires:
+        try:
+            return email.utils.parsedate_to_datetime(expires).timestamp()
+        except (TypeError, ValueError):
+            pass
+
+    # Revalidate every time when the server gave us validators, otherwise trust it for a while
+    if headers.get("ETag") or headers.get("Last-Modified"):
+        return now
+    return now + default_ttl
+
+class HttpCache(SharedInstances):
+    # URL -> content-addressed blob cache with conditional revalidation and LRU eviction.
+    # Blobs live under <directory>/blobs/<first two hex digits>/<sha256>.
+
+    def __init__(self, directory, max_bytes, memory_bytes=64 * 1024 * 1024, max_item_bytes=64 * 1024 * 1024, default_ttl=3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_bytes = memory_bytes
+        self.max_item_bytes = max_item_bytes
+        self.default_ttl = default_ttl
+        os.makedirs(os.path.join(directory, "blobs"), exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(os.path.join(directory, "index.sqlite3"), check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        # Bytes of distinct blobs, counted once here and then kept up to date by index() and evict()
+        self.total = self.db.execute(
+            "SELECT SUM(size) FROM (SELECT MAX(size) AS size FROM entries GROUP BY digest)").fetchone()[0] or 0
+
+        # Hot tier: url -> (bytes, content_type), least recently used first
+        self.memory = OrderedDict()
+        self.memory_size = 0
+
+    @classmethod
+    def from_config(cls, configdata):
+        # One instance per cache directory, shared by every engine in the process
+        if not configdata.get("cacheEnabled", True):
+            return None
+
+        directory = os.path.abspath(configdata.get("cacheDirectory", "data/cache"))
+        return cls.shared(directory, lambda: cls(
+            directory,
+            max_bytes=int(configdata.get("cacheMaxMB", 512)) * 1024 * 1024,
+            memory_bytes=int(configdata.get("cacheMemoryMB", 64)) * 1024 * 1024,
+            max_item_bytes=int(configdata.get("cacheMaxItemMB", 64)) * 1024 * 1024,
+            default_ttl=configdata.get("cacheDefaultTTL", 3600),
+        ))
+
+    def blob_path(self, digest):
+        return os.path.join(self.directory, "blobs", digest[:2], digest)
+
+    def lookup(self, url):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT digest, size, content_type, etag, last_modified, expires FROM entries WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        entry = dict(zip(("digest", "size", "content_type", "etag", "last_modified", "expires"), row))
+        if not os.path.exists(self.blob_path(entry['digest'])):
+            return None
+        return entry
+
+    def touch(self, url, expires=None):
+        with self.lock:
+            if expires is None:
+                self.db.execute("UPDATE entries SET last_access = ? WHERE url = ?", (time.time(), url))
+            else:
+                self.db.execute("UPDATE entries SET last_access = ?, expires = ? WHERE url = ?", (time.time(), expires, url))
+            self.db.commit()
+
+    def remember(self, url, content, content_type):
+        if len(content) > self.memory_bytes // 16:
+            return
+        with self.lock:
+            previous = self.memory.pop(url, None)
+            if previous:
+                self.memory_size -= len(previous[0])
+            self.memory[url] = (content, content_type)
+            self.memory_size += len(content)
+            while self.memory_size > self.memory_bytes and self.memory:
+                _, (old_content, _) = self.memory.popitem(last=False)
+                self.memory_size -= len(old_content)
+
+    def recall(self, url):
+        with self.lock:
+            hit = self.memory.get(url)
+            if hit:
+                self.memory.move_to_end(url)
+            return hit
+
+    def read_blob(self, url, entry):
+        hit = self.recall(url)
+        if hit:
+            return hit
+        with open(self.blob_path(entry['digest']), "rb") as f:
+            content = f.read()
+        self.remember(url, content, entry['content_type'])
+        return content, entry['content_type']
+
+    def conditional_headers(self, entry, headers):
+        headers = dict(headers or {})
+        if entry and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def fetch(self, session, url, headers=None, timeout=5, rate=None):
+        # Returns (content, content_type), raising requests.HTTPError like a plain get would.
+        # rate is an optional HostRateController pacing and retrying the request; hits make none.
+        entry = self.lookup(url)
+        if entry and entry['expires'] > time.time():
+            metrics.inc('scraper_cache_total', cache='http', result='hit')
+            self.touch(url)
+            return self.read_blob(url, entry)
+
+        def request():
+            response = session.get(url, headers=self.conditional_headers(entry, headers), timeout=timeout)
+            if response.status_code != 304 or not entry:
+                response.raise_for_status()
+            return response
+
+        response = rate.call(url, request) if rate else request()
+        if response.status_code == 304 and entry:
+            metrics.inc('scraper_cache_total', cache='http', result='revalidated')
+            self.touch(url, parse_expiry(response.headers, self.default_ttl) or time.time())
+            return self.read_blob(url, entry)
+
+        metrics.inc('scraper_cache_total', cache='http', result='miss')
+        content_type = response.headers.get("Content-Type", "")
+        self.store(url, response.content, response.headers)
+        self.remember(url, response.content, content_type)
+        return response.content, content_type
+
+    def validated_path(self, session, url, headers=None, timeout=5, rate=None):
+        # Blob path of a fresh (or successfully revalidated) copy of url, or None.
+        # rate is an optional HostRateController the revalidation request goes through.
+        entry = self.lookup(url)
+        if entry is None:
+            metrics.inc('scraper_cache_total', cache='http', result='miss')
+            return None
+        if entry['expires'] <= time.time():
+            if not entry['etag'] and not entry['last_modified']:
+                metrics.inc('scraper_cache_total', cache='http', result='miss')
+                return None
+
+            def revalidate():
+                # Response headers of a 304, None when the copy is stale, raises on errors
+                with session.get(url, headers=self.conditional_headers(entry, headers), stream=True, timeout=timeout) as response:
+                    if response.status_code == 304:
+                        return response.headers
+                    response.raise_for_status()
+                    return None
+
+            try:
+                # No retries: on any failure the download itself goes to the network
+                response_headers = rate.call(url, revalidate, retries=0) if rate else revalidate()
+            except Exception:
+                return None
+            if response_headers is None:
+                metrics.inc('scraper_cache_total', cache='http', result='miss')
+                return None
+            self.touch(url, parse_expiry(response_headers, self.default_ttl) or time.time())
+            metrics.inc('scraper_cache_total', cache='http', result='revalidated')
+        else:
+            metrics.inc('scraper_cache_total', cache='http', result='hit')
+            self.touch(url)
+        return self.blob_path(entry['digest'])
+
+    def store(self, url, content, response_headers):
+        expires = parse_expiry(response_headers, self.default_ttl)
+        if expires is None or len(content) > self.max_item_bytes:
+            return
+
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.blob_path(digest)
+        if not os.path.exists(path):
+            self.write_blob(path, lambda f: f.write(content))
+        self.index(url, digest, len(content), response_headers, expires)
+
+    def store_file(self, url, filepath, response_headers, digest=None):
+        # Adds an already downloaded file, hashing it in chunks (unless the digest is known) instead of loading it
+        expires = parse_expiry(response_headers, self.default_ttl)
+        size = os.path.getsize(filepath)
+        if expires is None or size > self.max_item_bytes:
+            return
+
+        if digest is None:
+            sha256 = hashlib.sha256()
+            with open(filepath, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    sha256.update(chunk)
+            digest = sha256.hexdigest()
+        path = self.blob_path(digest)
+        if not os.path.exists(path):
+            def copy_into(out):
+                with open(filepath, "rb") as source:
+                    shutil.copyfileobj(source, out)
+            self.write_blob(path, copy_into)
+        self.index(url, digest, size, response_headers, expires)
+
+    def write_blob(self, path, write):
+        # Written to a temp file and renamed so readers never see a partial blob
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def index(self, url, digest, size, response_headers, expires):
+        with self.lock:
+            previous = self.db.execute("SELECT digest, size FROM entries WHERE url = ?", (url,)).fetchone()
+            if not self.db.execute("SELECT 1 FROM entries WHERE digest = ?", (digest,)).fetchone():
+                self.total += size
+            self.db.execute(
+                "INSERT OR REPLACE INTO entries (url, digest, size, content_type, etag, last_modified, expires, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, digest, size, response_headers.get("Content-Type", ""), response_headers.get("ETag"),
+                 response_headers.get("Last-Modified"), expires, time.time()),
+            )
+            # The URL's old content no longer counts once nothing else points at it
+            if previous and previous[0] != digest and \
+                    not self.db.execute("SELECT 1 FROM entries WHERE digest = ?", (previous[0],)).fetchone():
+                self.total -= previous[1]
+            self.db.commit()
+        self.evict()
+
+    def evict(self):
+        if self.total <= self.max_bytes:
+            return
+
+        # Least recently used blobs go first, down to 90% of the cap so we don't evict on every store
+        target = self.max_bytes * 0.9
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT digest, MAX(size), MAX(last_access) AS accessed FROM entries GROUP BY digest ORDER BY accessed"
+            ).fetchall()
+            for digest, size, _ in rows:
+                if self.total <= target:
+                    break
+                self.db.execute("DELETE FROM entries WHERE digest = ?", (digest,))
+                try:
+                    os.remove(self.blob_path(digest))
+                except FileNotFoundError:
+                    pass
+                self.total -= size
+            self.db.commit()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,201 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .shared import SharedInstances
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    options TEXT NOT NULL,
+    download_path TEXT,
+    status TEXT NOT NULL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_url ON jobs (url, id);
+CREATE TABLE IF NOT EXISTS items (
+    job_id INTEGER NOT NULL,
+    idx INTEGER NOT NULL,
+    src TEXT NOT NULL,
+    type TEXT NOT NULL,
+    page TEXT,
+    width INTEGER,
+    height INTEGER,
+    metadata TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'found',
+    bytes INTEGER NOT NULL DEFAULT 0,
+    sha256 TEXT,
+    path TEXT,
+    error TEXT,
+    updated REAL NOT NULL,
+    PRIMARY KEY (job_id, src)
+);
+CREATE INDEX IF NOT EXISTS items_status ON items (job_id, status);
+"""
+
+# Item states that need no further work on resume
+FINISHED_STATUSES = ('downloaded', 'skipped', 'duplicate', 'linked')
+# Selected for download but not finished
+UNFINISHED_STATUSES = ('queued', 'failed')
+# Columns of their own; everything else about an item is kept in the metadata JSON
+ITEM_COLUMNS = ('src', 'type', 'page', 'width', 'height')
+
+class JobStore(SharedInstances):
+    # Every scrape is a job, and every media item it discovered a row with its metadata,
+    # download status, bytes, hash and final path. Writes are buffered and committed in
+    # batches (every batch_size rows or flush_seconds), WAL keeps readers off the writer's back,
+    # and a crash loses at most the last batch, which a resume simply downloads again.
+
+    def __init__(self, path, batch_size=200, flush_seconds=1.0):
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.pending_items = []
+        self.pending_results = []
+        self.last_flush = time.monotonic()
+
+    @classmethod
+    def from_config(cls, configdata):
+        if not configdata.get("jobStoreEnabled", True):
+            return None
+
+        path = os.path.abspath(configdata.get("jobStorePath", "data/jobs.sqlite3"))
+        return cls.shared(path, lambda: cls(path, configdata.get("jobBatchSize", 200), configdata.get("jobFlushSeconds", 1.0)))
+
+    def create_job(self, url, options, download_path=None):
+        now = time.time()
+        with self.lock:
+            cursor = self.db.execute(
+                "INSERT INTO jobs (url, options, download_path, status, created, updated) VALUES (?, ?, ?, 'discovering', ?, ?)",
+                (url, json.dumps(options, default=str), download_path, now, now))
+            self.db.commit()
+            return cursor.lastrowid
+
+    def set_job_status(self, job_id, status, download_path=None):
+        self.flush()
+        with self.lock:
+            self.db.execute("UPDATE jobs SET status = ?, download_path = COALESCE(?, download_path), updated = ? WHERE id = ?",
+                            (status, download_path, time.time(), job_id))
+            self.db.commit()
+
+    def add_item(self, job_id, idx, item):
+        metadata = {key: value for key, value in item.items() if key not in ITEM_COLUMNS and key != 'image'}
+        row = (job_id, idx, item['src'], item['type'], item.get('page'), item.get('width'), item.get('height'),
+               json.dumps(metadata, default=str), time.time())
+        with self.lock:
+            self.pending_items.append(row)
+        self.maybe_flush()
+
+    def queue_items(self, job_id, items):
+        # Marks (index, item) pairs as selected for download, under the index they are downloaded with
+        self.flush()
+        now = time.time()
+        with self.lock, self.db:
+            self.db.executemany(
+                "UPDATE items SET status = 'queued', idx = ?, updated = ? WHERE job_id = ? AND src = ? "
+                f"AND status NOT IN ({','.join('?' * len(FINISHED_STATUSES))})",
+                [(idx, now, job_id, item['src']) + FINISHED_STATUSES for idx, item in items])
+
+    def record_result(self, job_id, result):
+        # Called by download workers as each item finishes
+        row = (result['status'], result.get('bytes', 0), result.get('sha256'), result.get('path'),
+               result.get('error'), time.time(), job_id, result['src'])
+        with self.lock:
+            self.pending_results.append(row)
+        self.maybe_flush()
+
+    def maybe_flush(self):
+        with self.lock:
+            due = len(self.pending_items) + len(self.pending_results) >= self.batch_size \
+                or time.monotonic() - self.last_flush >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            items, self.pending_items = self.pending_items, []
+            results, self.pending_results = self.pending_results, []
+            self.last_flush = time.monotonic()
+            if not items and not results:
+                return
+            with self.db:
+                # A rediscovered item keeps its download state, only its metadata is refreshed
+                self.db.executemany(
+                    "INSERT INTO items (job_id, idx, src, type, page, width, height, metadata, updated) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (job_id, src) DO UPDATE SET "
+                    "metadata = excluded.metadata, updated = excluded.updated", items)
+                self.db.executemany(
+                    "UPDATE items SET status = ?, bytes = ?, sha256 = ?, path = ?, error = ?, updated = ? "
+                    "WHERE job_id = ? AND src = ?", results)
+
+    def row_to_item(self, row):
+        idx, src, media_type, page, width, height, metadata, status, size, sha256, path, error = row
+        item = dict(json.loads(metadata), src=src, type=media_type, page=page, width=width, height=height)
+        return idx, item, {'status': status, 'bytes': size, 'sha256': sha256, 'path': path, 'error': error}
+
+    def items(self, job_id, status=None, media_type=None):
+        # (index, item, state) triples, optionally filtered, in discovery order
+        self.flush()
+        query = ("SELECT idx, src, type, page, width, height, metadata, status, bytes, sha256, path, error "
+                 "FROM items WHERE job_id = ?")
+        params = [job_id]
+        if status:
+            statuses = [status] if isinstance(status, str) else list(status)
+            query += f" AND status IN ({','.join('?' * len(statuses))})"
+            params += statuses
+        if media_type:
+            query += " AND type = ?"
+            params.append(media_type)
+        with self.lock:
+            rows = self.db.execute(query + " ORDER BY idx", params).fetchall()
+        return [self.row_to_item(row) for row in rows]
+
+    def unfinished_items(self, job_id):
+        # What a resume has to download, as (index, item) pairs ready for download_items
+        return [(idx, item) for idx, item, _ in self.items(job_id, status=UNFINISHED_STATUSES)]
+
+    def job(self, job_id):
+        with self.lock:
+            row = self.db.execute("SELECT id, url, options, download_path, status, created, updated FROM jobs WHERE id = ?",
+                                  (job_id,)).fetchone()
+        return self.job_dict(row) if row else None
+
+    def job_dict(self, row):
+        job_id, url, options, download_path, status, created, updated = row
+        return {'id': job_id, 'url': url, 'options': json.loads(options), 'download_path': download_path,
+                'status': status, 'created': created, 'updated': updated}
+
+    def jobs(self, url=None, limit=50):
+        # Newest first, with item counts by status
+        self.flush()
+        query = "SELECT id, url, options, download_path, status, created, updated FROM jobs"
+        params = []
+        if url:
+            query += " WHERE url = ?"
+            params.append(url)
+        with self.lock:
+            rows = self.db.execute(query + " ORDER BY id DESC LIMIT ?", params + [limit]).fetchall()
+            jobs = [self.job_dict(row) for row in rows]
+            for job in jobs:
+                job['items'] = dict(self.db.execute(
+                    "SELECT status, COUNT(*) FROM items WHERE job_id = ? GROUP BY status", (job['id'],)).fetchall())
+        return jobs
+
+    def interrupted_job(self, url=None):
+        # The newest job whose download started but never finished
+        for job in self.jobs(url, limit=20):
+            if job['status'] == 'downloading':
+                return job
+        return None
+
+    def close(self):
+        self.flush()
@@ -0,0 +1,48 @@
+from io import BytesIO
+
+THUMBNAIL_WIDTH = 200
+POSTER_SIZE = (200, 120)
+
+# These run inside the thumbnail process pool, so they take and return plain picklable values:
+# encoded bytes in, (mode, size, raw pixels) out. PIL is imported on first use, not with the package.
+
+def render_thumbnail(image_data, width=THUMBNAIL_WIDTH):
+    from PIL import Image
+    img_pil = Image.open(BytesIO(image_data))
+    if img_pil.width > width:
+        target = (width, max(1, int(img_pil.height * width / img_pil.width)))
+        # JPEG decodes straight to 1/2, 1/4 or 1/8 scale in the DCT domain
+        img_pil.draft("RGB", target)
+        # thumbnail() keeps the aspect ratio and uses reduce() for the coarse steps
+        img_pil.thumbnail(target, Image.LANCZOS, reducing_gap=2.0)
+    return pack_image(img_pil)
+
+def render_poster(image_data, size=POSTER_SIZE):
+    from PIL import Image
+    image = Image.open(BytesIO(image_data))
+    image.draft("RGB", size)
+    image = image.resize(size, Image.LANCZOS, reducing_gap=2.0)  # Resize for consistency
+    return pack_image(image)
+
+def pack_image(image):
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+    return image.mode, image.size, image.tobytes()
+
+def unpack_image(packed):
+    from PIL import Image
+    mode, size, data = packed
+    return Image.frombytes(mode, size, data)
+
+def image_size(image_data):
+    # (width, height) read from the header, None when PIL can't tell (SVG, truncated bodies)
+    from PIL import Image
+    try:
+        with Image.open(BytesIO(image_data)) as image:
+            return image.size
+    except Exception:
+        return None
+
+def blank_thumbnail():
+    from PIL import Image
+    return Image.new("RGB", (200, 200), (255, 255, 255))
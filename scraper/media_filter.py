@@ -0,0 +1,85 @@
+import re
+
+# Filter name -> (config key, default). Values given for one scrape (the window's filter
+# fields, CLI flags) override these; 0 or null means no limit.
+FILTER_OPTIONS = {
+    'min_width': ("filterMinWidth", 32),
+    'min_height': ("filterMinHeight", 32),
+    'max_width': ("filterMaxWidth", None),
+    'max_height': ("filterMaxHeight", None),
+    'min_aspect': ("filterMinAspect", None),
+    'max_aspect': ("filterMaxAspect", None),
+    'min_bytes': ("filterMinBytes", 0),
+    'max_bytes': ("filterMaxBytes", None),
+    'src_pattern': ("filterSrcPattern", None),
+    'alt_pattern': ("filterAltPattern", None),
+    'class_pattern': ("filterClassPattern", None),
+    'selector': ("filterSelector", None),
+}
+# Regular expressions, matched case-insensitively in the page and again in Python. A pattern
+# JavaScript can't compile is skipped in the page and only applied in Python.
+PATTERN_FILTERS = ('src_pattern', 'alt_pattern', 'class_pattern')
+
+def resolve_filters(configdata, filters=None):
+    # The full filter set for one scrape, JSON-serializable so the page can evaluate it too
+    resolved = {'class': "", 'id': "", 'src': ""}
+    resolved.update((name, configdata.get(key, default)) for name, (key, default) in FILTER_OPTIONS.items())
+    resolved.update((name, value) for name, value in (filters or {}).items() if value not in (None, ""))
+    for name in PATTERN_FILTERS:
+        if resolved[name]:
+            try:
+                re.compile(resolved[name])
+            except re.error as e:
+                raise ValueError(f"Invalid {name.replace('_', ' ')} {resolved[name]!r}: {e}")
+    return resolved
+
+def within(value, low, high):
+    return (not low or value >= low) and (not high or value <= high)
+
+def matches_filters(element, filters):
+    # element is one entry of the EXTRACT_MEDIA_SCRIPT result (or the static parser's), no
+    # WebDriver calls here. Mirrors the in-page check in EXTRACT_MEDIA_SCRIPT except for the
+    # selector, which only the browser can evaluate. Unknown sizes (0) always pass.
+    class_filter = filters.get('class')
+    id_filter = filters.get('id')
+    src_filter = filters.get('src')
+
+    if class_filter:
+        element_class = element['class']
+        if not element_class or class_filter not in element_class:
+            return False
+
+    if id_filter:
+        element_id = element['id']
+        if not element_id or id_filter not in element_id:
+            return False
+
+    if src_filter:
+        element_src = element['src']
+        if not element_src or src_filter not in element_src:
+            return False
+
+    texts = {
+        'src_pattern': element['src'] or element['source_src'],
+        'alt_pattern': element.get('alt', ''),
+        'class_pattern': element['class'],
+    }
+    for name, text in texts.items():
+        if filters.get(name) and not re.search(filters[name], text, re.IGNORECASE):
+            return False
+
+    width, height = element['naturalWidth'], element['naturalHeight']
+    if width and height:
+        if not within(width, filters.get('min_width'), filters.get('max_width')):
+            return False
+        if not within(height, filters.get('min_height'), filters.get('max_height')):
+            return False
+        if not within(width / height, filters.get('min_aspect'), filters.get('max_aspect')):
+            return False
+
+    # Only images: a video's transfer size is just whatever part of it the page buffered
+    size = element.get('transferSize') or 0
+    if element['tag'] == 'img' and size and not within(size, filters.get('min_bytes'), filters.get('max_bytes')):
+        return False
+
+    return True
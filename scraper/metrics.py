@@ -0,0 +1,194 @@
+import bisect
+import json
+import os
+import threading
+import time
+import urllib.parse
+from contextlib import contextmanager
+
+# Upper bounds in seconds, shared by every histogram
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+HELP = {
+    'scraper_stage_seconds': "Time spent in each stage of a scrape or download",
+    'scraper_request_seconds': "Time from sending an HTTP request to receiving its headers",
+    'scraper_requests_total': "HTTP requests by host and status code",
+    'scraper_bytes_total': "Bytes of media received, by source",
+    'scraper_retries_total': "Transfers resumed after a dropped connection",
+    'scraper_backoffs_total': "Requests retried after backing off, by host and reason",
+    'scraper_cache_total': "Cache lookups by cache and result",
+    'scraper_errors_total': "Failed items by stage and status",
+}
+
+def label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (f'{name}="{escape(value)}"' for name, value in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class Metrics:
+    # Process-wide counters, latency histograms and timed spans. Spans are also written as
+    # JSON lines to metricsLogPath, and everything renders in the Prometheus text format
+    # for metricsTextfile or the metricsPort endpoint.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.log_path = None
+        self.log_file = None
+        self.textfile = None
+        self.server = None
+
+    def configure(self, configdata):
+        # Safe to call for every engine; the endpoint is only started once
+        with self.lock:
+            log_path = configdata.get("metricsLogPath")
+            if log_path != self.log_path:
+                if self.log_file:
+                    self.log_file.close()
+                self.log_path = log_path
+                self.log_file = open(log_path, "a") if log_path else None
+            self.textfile = configdata.get("metricsTextfile")
+        port = configdata.get("metricsPort")
+        if port and self.server is None:
+            self.serve(port)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, seconds, **labels):
+        key = (name, label_key(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def span(self, stage, **fields):
+        # Times a stage into scraper_stage_seconds and logs it, marking it failed if it raises
+        started = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - started, error=str(error) if error else None, **fields)
+
+    def record(self, stage, seconds, **fields):
+        # For stages whose start and end don't fit in one with block
+        self.observe('scraper_stage_seconds', seconds, stage=stage)
+        self.log('span', stage=stage, seconds=round(seconds, 6), **fields)
+
+    def count_error(self, stage, error):
+        # HTTP errors are counted by status code, everything else by exception type
+        response = getattr(error, 'response', None)
+        status = response.status_code if response is not None else type(error).__name__
+        self.inc('scraper_errors_total', stage=stage, status=status)
+
+    def log(self, event, **fields):
+        if not self.log_file:
+            return
+        line = json.dumps(dict({'ts': round(time.time(), 3), 'event': event}, **fields), default=str)
+        with self.lock:
+            if self.log_file:
+                self.log_file.write(line + "\n")
+                self.log_file.flush()
+
+    def record_response(self, response, *args, **kwargs):
+        # requests response hook installed by make_session
+        host = urllib.parse.urlparse(response.url).netloc
+        self.inc('scraper_requests_total', host=host, status=response.status_code)
+        self.observe('scraper_request_seconds', response.elapsed.total_seconds(), host=host)
+
+    def render(self):
+        # Prometheus text exposition format
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, list(h.counts), h.sum, h.count) for key, h in self.histograms.items())
+
+        lines = []
+        seen = set()
+        for (name, key), value in counters:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{format_labels(key)} {value}")
+
+        for (name, key), counts, total, count in histograms:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, bucket in zip(list(LATENCY_BUCKETS) + ["+Inf"], counts):
+                cumulative += bucket
+                lines.append(f"{name}_bucket{format_labels(key, [('le', str(bound))])} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(key)} {total:.6f}")
+            lines.append(f"{name}_count{format_labels(key)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        # Rewrites metricsTextfile atomically, for node_exporter's textfile collector or plain reading
+        if not self.textfile:
+            return
+        try:
+            directory = os.path.dirname(os.path.abspath(self.textfile))
+            os.makedirs(directory, exist_ok=True)
+            temp_path = f"{self.textfile}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as f:
+                f.write(self.render())
+            os.replace(temp_path, self.textfile)
+        except OSError as e:
+            print(f"Failed to write metrics to {self.textfile}: {e}")
+
+    def serve(self, port):
+        # Imported here, most runs never start the endpoint
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self.server = ThreadingHTTPServer(("127.0.0.1", int(port)), MetricsHandler)
+        except OSError as e:
+            print(f"Failed to start metrics endpoint on port {port}: {e}")
+            return
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+metrics = Metrics()
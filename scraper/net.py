@@ -0,0 +1,52 @@
+import urllib.parse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .metrics import metrics
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+def make_session(pool_size, headers=None):
+    # One pooled connection per worker so requests never wait on the adapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if headers:
+        session.headers.update(headers)
+    # Counts every request and its latency by host
+    session.hooks['response'].append(metrics.record_response)
+    return session
+
+def request_headers(reference_headers, url, page_url):
+    # Adjust headers for this specific request
+    current_headers = dict(reference_headers or {})
+    parsed_url = urllib.parse.urlparse(url)
+
+    # Update domain-specific headers
+    current_headers['Host'] = parsed_url.netloc
+    if parsed_url.netloc != urllib.parse.urlparse(page_url).netloc:
+        current_headers['Sec-Fetch-Site'] = 'cross-site'
+    else:
+        current_headers['Sec-Fetch-Site'] = 'same-origin'
+    return current_headers
+
+def normalize_url(url):
+    url = url.strip()
+    if not url.startswith(('http://', 'https://')):
+        url = 'https://' + url
+    return url
+
+def origin_of(url):
+    parsed_url = urllib.parse.urlparse(url)
+    return parsed_url.scheme + '://' + parsed_url.netloc
+
+def fetch_image(session, url, ref=None, timeout=5):
+    # Raises like session.get, so a HostRateController wrapped around it sees throttling
+    headers = {"User-Agent": USER_AGENT}
+    if ref:
+        headers["Referer"] = ref
+    response = session.get(url, headers=headers, timeout=timeout)
+    response.raise_for_status()
+    return response.content
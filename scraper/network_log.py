@@ -0,0 +1,189 @@
+import base64
+import json
+import threading
+
+from .media import image_size
+from .net import origin_of
+
+MEDIA_RESOURCE_TYPES = ("Image", "Media")
+# Pieces of a stream rather than a playable file
+SEGMENT_MIME_TYPES = ("video/mp2t", "video/iso.segment", "video/vnd.dlna.mpeg-tts")
+# Resource type of a request -> the kind of header profile it provides
+PROFILE_KINDS = {'Image': 'image', 'Media': 'video'}
+# Headers that belong to one particular request rather than to the client; cookies come from the synced jar
+REQUEST_SPECIFIC_HEADERS = ("cookie", "host", "content-length", "range", "if-range", "if-none-match", "if-modified-since")
+
+def canonical_headers(headers):
+    # HTTP/2 reports lowercase names, the initial request event mixed case
+    return {"-".join(part.capitalize() for part in name.split("-")): value
+            for name, value in headers.items() if not name.startswith(":")}
+
+def profile_headers(headers):
+    return {name: value for name, value in headers.items() if name.lower() not in REQUEST_SPECIFIC_HEADERS}
+
+class NetworkCollector:
+    # Reads Chrome's performance log (enabled by goog:loggingPrefs in create_driver) and
+    # keeps one record per image/video response seen while the page loads and scrolls.
+    # It also keeps the request headers Chrome sent for media, per origin, so requests
+    # can reproduce them without asking the page. With harvest off only the headers are kept.
+    def __init__(self, driver, harvest=True):
+        self.driver = driver
+        self.harvest = harvest
+        self.responses = {}  # url -> record
+        self.by_request = {}  # requestId -> record
+        self.requests = {}  # requestId -> {'kind', 'url', 'headers'} for media requests
+        self.header_profiles = {}  # (origin, kind) -> headers
+        # WebDriver calls are serialized, workers read bodies while the producer still runs
+        self.lock = threading.Lock()
+
+    def reset(self):
+        # Drop whatever an earlier page left in the log
+        with self.lock:
+            try:
+                self.driver.get_log("performance")
+            except Exception as e:
+                print(f"Performance log unavailable: {e}")
+            self.responses = {}
+            self.by_request = {}
+            self.requests = {}
+
+    def poll(self):
+        with self.lock:
+            try:
+                entries = self.driver.get_log("performance")
+            except Exception as e:
+                print(f"Performance log unavailable: {e}")
+                return
+
+        for entry in entries:
+            try:
+                message = json.loads(entry["message"])["message"]
+            except (KeyError, ValueError):
+                continue
+            self.handle_event(message.get("method"), message.get("params", {}))
+
+    def handle_event(self, method, params):
+        if method == "Network.requestWillBeSent":
+            kind = PROFILE_KINDS.get(params.get("type"))
+            request = params.get("request", {})
+            if kind and request.get("url", "").startswith(("http://", "https://")):
+                self.add_request_headers(params.get("requestId"), request.get("headers", {}), kind, request["url"])
+            else:
+                self.requests.pop(params.get("requestId"), None)
+
+        elif method == "Network.requestWillBeSentExtraInfo":
+            # What actually went on the wire, including Sec-Fetch-* and cookies; may arrive first
+            self.add_request_headers(params.get("requestId"), params.get("headers", {}))
+
+        elif method == "Network.responseReceived" and self.harvest:
+            response = params.get("response", {})
+            mime_type = response.get("mimeType", "")
+            url = response.get("url", "")
+            if not url.startswith(("http://", "https://")):
+                return
+            if params.get("type") not in MEDIA_RESOURCE_TYPES and not mime_type.startswith(("image/", "video/")):
+                return
+
+            headers = {key.lower(): value for key, value in response.get("headers", {}).items()}
+            try:
+                size = int(headers.get("content-length", 0))
+            except ValueError:
+                size = 0
+
+            record = {
+                'url': url,
+                'mime_type': mime_type,
+                'status': response.get("status", 0),
+                'size': size,
+                'request_id': params.get("requestId"),
+                'resource_type': params.get("type"),
+                'finished': False,
+            }
+            self.responses[url] = record
+            self.by_request[record['request_id']] = record
+
+        elif method == "Network.loadingFinished":
+            record = self.by_request.get(params.get("requestId"))
+            if record:
+                record['finished'] = True
+                record['size'] = record['size'] or int(params.get("encodedDataLength", 0))
+
+    def add_request_headers(self, request_id, headers, kind=None, url=None):
+        pending = self.requests.setdefault(request_id, {'kind': None, 'url': None, 'headers': {}})
+        headers = canonical_headers(headers)
+        if kind:
+            pending['kind'], pending['url'] = kind, url
+            # Anything already merged from ExtraInfo is more accurate than the initial headers
+            pending['headers'] = dict(headers, **pending['headers'])
+        else:
+            pending['headers'].update(headers)
+        if pending['kind']:
+            self.header_profiles[(origin_of(pending['url']), pending['kind'])] = profile_headers(pending['headers'])
+
+    def cookies(self):
+        # Every cookie in the browser, not just the current page's domain, so CDN hosts get theirs too
+        with self.lock:
+            try:
+                return self.driver.execute_cdp_cmd("Network.getAllCookies", {}).get("cookies", [])
+            except Exception:
+                return self.driver.get_cookies()
+
+    def media_records(self):
+        return [
+            record for record in self.responses.values()
+            if 200 <= record['status'] < 300 and record['mime_type'].startswith(("image/", "video/"))
+        ]
+
+    def extra_elements(self, known_urls):
+        # Media that was fetched but never showed up as an img/video tag (CSS backgrounds, XHR galleries).
+        # Images need a size decoded from the body Chrome holds, or favicons, sprites and tracking
+        # pixels would slip past the size filters that unknown sizes always pass.
+        # Videos must be whole files a media element asked for, not HLS/MSE segments or partial responses.
+        elements = []
+        for record in self.media_records():
+            if record['url'] in known_urls:
+                continue
+            width = height = 0
+            if record['mime_type'].startswith("image/"):
+                tag = 'img'
+                body = self.get_body(record['url'])
+                size = image_size(body[0]) if body else None
+                if not size:
+                    continue
+                width, height = size
+            else:
+                tag = 'video'
+                if record['status'] != 200 or record['resource_type'] != "Media" \
+                        or record['mime_type'] in SEGMENT_MIME_TYPES:
+                    continue
+            elements.append({
+                'tag': tag,
+                'src': record['url'],
+                'class': '',
+                'id': '',
+                'alt': '',
+                'poster': '',
+                'source_src': '',
+                'naturalWidth': width,
+                'naturalHeight': height,
+                'transferSize': record['size'] or 0,
+            })
+        return elements
+
+    def get_body(self, url):
+        # Returns (bytes, mime_type) from the browser's buffer, or None if Chrome no longer has it
+        record = self.responses.get(url)
+        if not record or not record['finished'] or record['status'] != 200:
+            return None
+
+        with self.lock:
+            try:
+                result = self.driver.execute_cdp_cmd("Network.getResponseBody", {'requestId': record['request_id']})
+            except Exception:
+                return None
+
+        if result.get("base64Encoded"):
+            body = base64.b64decode(result.get("body", ""))
+        else:
+            body = result.get("body", "").encode("utf-8")
+        return body, record['mime_type']
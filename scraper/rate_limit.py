@@ -0,0 +1,144 @@
+import email.utils
+import random
+import threading
+import time
+import urllib.parse
+from contextlib import contextmanager
+
+import requests
+
+from .metrics import metrics
+from .shared import SharedInstances
+
+# Responses that mean "slow down": the host's window is halved and the request retried
+THROTTLE_STATUSES = (429, 503)
+# Worth another try, but not a sign of overload
+RETRY_STATUSES = (500, 502, 504)
+THROTTLE_ERRORS = (requests.exceptions.Timeout, requests.exceptions.ConnectionError)
+# A host's window is halved at most once per this many seconds, so one burst of 429s counts once
+DECREASE_INTERVAL = 1.0
+
+def retry_after_seconds(response):
+    # Retry-After is either a number of seconds or an HTTP date
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class HostState:
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.last_decrease = 0.0
+
+class HostRateController(SharedInstances):
+    # Adaptive per-host concurrency, AIMD-style like TCP congestion control: each host starts
+    # with initial_limit requests in flight, gains about one slot per window of successes up
+    # to max_limit, and is halved on 429/503, timeouts and dropped connections. Retry-After
+    # pauses the whole host. call() retries with capped exponential backoff and full jitter.
+    # One instance is shared by thumbnails, posters, size probes, cache revalidation and downloads.
+
+    def __init__(self, initial_limit=4, max_limit=6, retries=4, backoff_base=0.5, backoff_max=30.0, max_retry_after=120.0):
+        self.max_limit = max(1, int(max_limit))
+        self.initial_limit = min(max(1, initial_limit), self.max_limit)
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+        self.condition = threading.Condition()
+        self.hosts = {}
+
+    @classmethod
+    def from_config(cls, configdata):
+        options = (
+            configdata.get("rateInitialConnections", 4),
+            configdata.get("maxConnectionsPerHost", 6),
+            configdata.get("rateRetries", 4),
+            configdata.get("rateBackoffBase", 0.5),
+            configdata.get("rateBackoffMax", 30.0),
+            configdata.get("rateMaxRetryAfter", 120.0),
+        )
+        return cls.shared(options, lambda: cls(*options))
+
+    def host(self, url):
+        host = urllib.parse.urlparse(url).netloc
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = HostState(self.initial_limit)
+        return host, state
+
+    @contextmanager
+    def slot(self, url, connections=1):
+        # Blocks while the host is paused or its window can't take connections more requests.
+        # An idle host always lets one caller in, even one that needs more than the whole window.
+        with self.condition:
+            _, state = self.host(url)
+            while True:
+                wait = state.blocked_until - time.monotonic()
+                if wait <= 0 and (state.in_flight == 0 or state.in_flight + connections <= int(state.limit)):
+                    break
+                self.condition.wait(wait if wait > 0 else None)
+            state.in_flight += connections
+        try:
+            yield
+        finally:
+            with self.condition:
+                state.in_flight -= connections
+                self.condition.notify_all()
+
+    def succeeded(self, url):
+        with self.condition:
+            _, state = self.host(url)
+            state.limit = min(self.max_limit, state.limit + 1 / state.limit)
+            self.condition.notify_all()
+
+    def throttled(self, url, pause=None):
+        with self.condition:
+            host, state = self.host(url)
+            now = time.monotonic()
+            if now - state.last_decrease >= DECREASE_INTERVAL:
+                state.limit = max(1.0, state.limit / 2)
+                state.last_decrease = now
+            if pause:
+                state.blocked_until = max(state.blocked_until, now + min(pause, self.max_retry_after))
+        metrics.log('throttled', host=host, limit=round(state.limit, 2), pause=pause)
+
+    def backoff(self, attempt):
+        # Full jitter: anywhere between zero and the capped exponential delay
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def call(self, url, function, retries=None, retry_errors=(), connections=1):
+        # Runs function() in url's host slots, retrying failures worth retrying up to retries
+        # times (rateRetries by default). retry_errors are retried too without counting against
+        # the host, like a truncated body. connections is how many requests function() opens at once.
+        retries = self.retries if retries is None else retries
+        for attempt in range(retries + 1):
+            try:
+                with self.slot(url, connections):
+                    result = function()
+            except Exception as e:
+                response = getattr(e, 'response', None)
+                status = response.status_code if response is not None else None
+                pause = None
+                if status in THROTTLE_STATUSES or (status is None and isinstance(e, THROTTLE_ERRORS)):
+                    pause = retry_after_seconds(response)
+                    self.throttled(url, pause)
+                elif status not in RETRY_STATUSES and not (status is None and isinstance(e, retry_errors)):
+                    raise
+                if attempt == retries:
+                    raise
+                reason = status or type(e).__name__
+                metrics.inc('scraper_backoffs_total', host=urllib.parse.urlparse(url).netloc, reason=reason)
+                # A Retry-After pause is waited out in slot(), the jitter keeps retries from lining up
+                time.sleep(self.backoff(attempt))
+                continue
+            self.succeeded(url)
+            return result
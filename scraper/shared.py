@@ -0,0 +1,58 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+class SharedInstances:
+    # Base for objects built from the config and shared by every engine in the process, one
+    # per key (a cache directory, an index file, a set of options). Each subclass gets its own
+    # registry; shared_lock is reentrant so from_config can do more under it, like counting users.
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.shared_instances = {}
+        cls.shared_lock = threading.RLock()
+
+    @classmethod
+    def shared(cls, key, create):
+        # The instance registered under key, made with create() the first time
+        with cls.shared_lock:
+            instance = cls.shared_instances.get(key)
+            if instance is None:
+                instance = create()
+                cls.shared_instances[key] = instance
+            return instance
+
+class ProcessPool:
+    # Process pool started on first use, so CPU-heavy image work doesn't serialize on the GIL.
+    # With 0 processes, or once the pool has died, functions run in the calling thread instead.
+    def __init__(self, name, processes=None):
+        self.name = name
+        self.processes = (os.cpu_count() or 1) if processes is None else int(processes)
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def run(self, function, *args):
+        # Blocks the calling worker thread until a process has the result
+        executor = self.get_executor()
+        if executor is None:
+            return function(*args)
+        try:
+            return executor.submit(function, *args).result()
+        except BrokenProcessPool:
+            print(f"{self.name} process pool died, running in-process")
+            with self.lock:
+                self.executor = None
+                self.processes = 0
+            return function(*args)
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None and self.processes > 0:
+                self.executor = ProcessPoolExecutor(max_workers=self.processes)
+            return self.executor
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,131 @@
+import re
+import urllib.parse
+from html.parser import HTMLParser
+
+# Markup that means the real content is rendered by JavaScript
+JS_APP_MARKERS = re.compile(
+    r'__NEXT_DATA__|__NUXT__|ng-version=|data-reactroot|id="(?:root|app)"\s*>\s*</div>|window\.__INITIAL_STATE__',
+    re.IGNORECASE,
+)
+LAZY_SRC_ATTRIBUTES = ("data-src", "data-lazy-src", "data-original", "data-lazy")
+
+def parse_srcset(srcset):
+    # Returns the candidate with the largest width/density descriptor
+    best_url, best_size = None, -1.0
+    for candidate in srcset.split(","):
+        parts = candidate.strip().split()
+        if not parts:
+            continue
+        size = 1.0
+        if len(parts) > 1:
+            try:
+                size = float(parts[1][:-1])
+            except ValueError:
+                pass
+        if size > best_size:
+            best_url, best_size = parts[0], size
+    return best_url
+
+def parse_dimension(value):
+    try:
+        return int(str(value).strip().rstrip("px"))
+    except (TypeError, ValueError):
+        return 0
+
+class MediaHTMLParser(HTMLParser):
+    # Builds the same element dicts as EXTRACT_MEDIA_SCRIPT from raw HTML, fed chunk by chunk
+    def __init__(self, base_url):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.elements = []
+        # Every link target, for crawl mode
+        self.links = []
+        self.lazy_images = 0
+        self.current_video = None
+
+    def resolve(self, url):
+        return urllib.parse.urljoin(self.base_url, url.strip()) if url else ''
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict((name, value or '') for name, value in attrs)
+
+        if tag == 'base' and attrs.get('href'):
+            self.base_url = self.resolve(attrs['href'])
+
+        elif tag in ('a', 'area') and attrs.get('href'):
+            self.links.append(self.resolve(attrs['href']))
+
+        elif tag == 'link' and attrs.get('href') and 'next' in attrs.get('rel', '').lower().split():
+            self.links.append(self.resolve(attrs['href']))
+
+        elif tag == 'img':
+            src = attrs.get('src', '')
+            lazy_src = next((attrs[name] for name in LAZY_SRC_ATTRIBUTES if attrs.get(name)), '')
+            if lazy_src and (not src or src.startswith('data:')):
+                # Placeholder swapped in by a lazy-loading script
+                self.lazy_images += 1
+                src = lazy_src
+            if not src and attrs.get('srcset'):
+                src = parse_srcset(attrs['srcset']) or ''
+
+            self.elements.append({
+                'tag': 'img',
+                'src': src if src.startswith('data:') else self.resolve(src),
+                'class': attrs.get('class', ''),
+                'id': attrs.get('id', ''),
+                'alt': attrs.get('alt', ''),
+                'poster': '',
+                'source_src': '',
+                'naturalWidth': parse_dimension(attrs.get('width')),
+                'naturalHeight': parse_dimension(attrs.get('height')),
+            })
+
+        elif tag == 'video':
+            self.current_video = {
+                'tag': 'video',
+                'src': self.resolve(attrs.get('src', '')),
+                'class': attrs.get('class', ''),
+                'id': attrs.get('id', ''),
+                'alt': '',
+                'poster': self.resolve(attrs.get('poster', '')),
+                'source_src': '',
+                'naturalWidth': parse_dimension(attrs.get('width')),
+                'naturalHeight': parse_dimension(attrs.get('height')),
+            }
+            self.elements.append(self.current_video)
+
+        elif tag == 'source' and self.current_video is not None and not self.current_video['source_src']:
+            src = attrs.get('src') or parse_srcset(attrs.get('srcset', '')) or ''
+            self.current_video['source_src'] = self.resolve(src)
+
+    def handle_endtag(self, tag):
+        if tag == 'video':
+            self.current_video = None
+
+def fetch_static_page(session, url, headers, min_images=3, timeout=10):
+    # Returns (elements, final_url, links), or None when the page needs a real browser
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        if "html" not in response.headers.get("Content-Type", ""):
+            return None
+
+        response.encoding = response.encoding or "utf-8"
+        parser = MediaHTMLParser(response.url)
+        has_js_markers = False
+        tail = ""
+        for chunk in response.iter_content(chunk_size=65536, decode_unicode=True):
+            if not chunk:
+                continue
+            parser.feed(chunk)
+            # Keep a little overlap so markers split across chunks are still found
+            if not has_js_markers and JS_APP_MARKERS.search(tail + chunk):
+                has_js_markers = True
+            tail = chunk[-64:]
+        parser.close()
+
+    images = [el for el in parser.elements if el['tag'] == 'img' and el['src'] and not el['src'].startswith('data:')]
+    if has_js_markers or len(images) < min_images:
+        return None
+    if parser.lazy_images * 2 > len(images):
+        return None
+    return parser.elements, response.url, parser.links
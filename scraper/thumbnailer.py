@@ -0,0 +1,68 @@
+import threading
+from collections import OrderedDict
+
+from .media import render_poster, render_thumbnail, unpack_image
+from .metrics import metrics
+from .shared import ProcessPool, SharedInstances
+
+class Thumbnailer(SharedInstances):
+    # Decodes thumbnails in a process pool so big photos don't serialize on the GIL,
+    # and keeps the finished tiles in a byte-capped LRU keyed by (kind, url).
+
+    def __init__(self, processes=None, cache_bytes=64 * 1024 * 1024):
+        self.pool = ProcessPool("Thumbnail", processes)
+        self.cache_bytes = cache_bytes
+        self.lock = threading.Lock()
+        self.tiles = OrderedDict()
+        self.tiles_size = 0
+
+    @classmethod
+    def from_config(cls, configdata):
+        processes = configdata.get("thumbnailProcesses")
+        cache_bytes = int(configdata.get("thumbnailCacheMB", 64)) * 1024 * 1024
+        key = (processes, cache_bytes)
+        return cls.shared(key, lambda: cls(processes, cache_bytes))
+
+    def cached(self, kind, url):
+        with self.lock:
+            packed = self.tiles.get((kind, url))
+            if packed is None:
+                metrics.inc('scraper_cache_total', cache='thumbnail', result='miss')
+                return None
+            self.tiles.move_to_end((kind, url))
+        metrics.inc('scraper_cache_total', cache='thumbnail', result='hit')
+        return unpack_image(packed)
+
+    def thumbnail(self, url, image_data):
+        return self.render('thumbnail', url, render_thumbnail, image_data)
+
+    def poster(self, url, image_data):
+        return self.render('poster', url, render_poster, image_data)
+
+    def render(self, kind, url, function, image_data):
+        image = self.cached(kind, url)
+        if image is not None:
+            return image
+
+        packed = self.run(function, image_data)
+        with self.lock:
+            if (kind, url) not in self.tiles:
+                self.tiles[(kind, url)] = packed
+                self.tiles_size += len(packed[2])
+            while self.tiles_size > self.cache_bytes and self.tiles:
+                _, old = self.tiles.popitem(last=False)
+                self.tiles_size -= len(old[2])
+        return unpack_image(packed)
+
+    def run(self, function, image_data):
+        # Called from thumbnail worker threads, blocks until a process has decoded the image
+        with metrics.span('decode'):
+            return self.pool.run(function, image_data)
+
+    def clear(self):
+        with self.lock:
+            self.tiles.clear()
+            self.tiles_size = 0
+
+    def shutdown(self):
+        self.pool.shutdown()
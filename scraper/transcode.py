@@ -0,0 +1,107 @@
+import json
+import os
+
+from .metrics import metrics
+from .shared import ProcessPool, SharedInstances
+
+# Output format name -> (PIL format, file extension)
+OUTPUT_FORMATS = {
+    'webp': ("WEBP", ".webp"),
+    'avif': ("AVIF", ".avif"),
+    'jpeg': ("JPEG", ".jpg"),
+    'jpg': ("JPEG", ".jpg"),
+    'png': ("PNG", ".png"),
+}
+
+def policy_for(policies, mime_type):
+    # "image/png" beats "image"
+    return policies.get(mime_type) or policies.get(mime_type.split("/")[0])
+
+def transcode_image(path, output_path, policies):
+    # Runs inside the transcode process pool: reads the downloaded file at path, writes the
+    # result to output_path and returns what it did, or None when the policy leaves it alone
+    from PIL import Image, ImageOps
+
+    image = Image.open(path)
+    source_format = image.format
+    policy = policy_for(policies, Image.MIME.get(source_format, "image/"))
+    if not policy or getattr(image, "is_animated", False):
+        return None
+
+    # Without a format the image keeps its own, and its file extension (None here)
+    output_format, extension = OUTPUT_FORMATS.get(str(policy.get("format") or "").lower(), (source_format, None))
+    max_edge = policy.get("maxEdge")
+    resize = bool(max_edge) and max(image.size) > max_edge
+    strip = policy.get("stripMetadata", True)
+    if output_format == source_format and not resize and not strip:
+        return None
+
+    if resize:
+        scale = max_edge / max(image.size)
+        target = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+        # JPEG decodes straight to 1/2, 1/4 or 1/8 scale in the DCT domain
+        image.draft(image.mode, target)
+    # Orientation is applied to the pixels, so dropping the EXIF doesn't turn photos sideways
+    image = ImageOps.exif_transpose(image)
+    if resize:
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS, reducing_gap=2.0)
+
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    if output_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    elif image.mode not in ("RGB", "RGBA", "L"):
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+    options = {'quality': policy.get("quality", 80)}
+    if output_format == "PNG":
+        options = {'optimize': True}
+    # The color profile is part of the picture, not metadata
+    if image.info.get("icc_profile"):
+        options['icc_profile'] = image.info["icc_profile"]
+    if not strip:
+        exif = image.getexif()
+        if exif:
+            options['exif'] = exif.tobytes()
+    image.save(output_path, format=output_format, **options)
+
+    size = os.path.getsize(output_path)
+    if policy.get("onlyIfSmaller", True) and not resize and size >= os.path.getsize(path):
+        os.remove(output_path)
+        return None
+    return {
+        'format': output_format.lower(),
+        'extension': extension,
+        'width': image.width,
+        'height': image.height,
+        'bytes': size,
+        'keep_original': policy.get("keepOriginal", False),
+    }
+
+class Transcoder(SharedInstances):
+    # Resizes and re-encodes images as they finish downloading, in a process pool so
+    # the encoders don't serialize on the GIL. transcodePolicies maps "image" or a MIME
+    # type like "image/png" to {format, quality, maxEdge, stripMetadata, keepOriginal, onlyIfSmaller}.
+
+    def __init__(self, policies, processes=None):
+        self.policies = policies
+        self.pool = ProcessPool("Transcode", processes)
+
+    @classmethod
+    def from_config(cls, configdata):
+        # None unless there is a policy for some kind of image
+        policies = {key: value for key, value in (configdata.get("transcodePolicies") or {}).items()
+                    if value and key.split("/")[0] == "image"}
+        if not policies:
+            return None
+
+        processes = configdata.get("transcodeProcesses")
+        key = (json.dumps(policies, sort_keys=True), processes)
+        return cls.shared(key, lambda: cls(policies, processes))
+
+    def transcode(self, path, output_path):
+        # Called from download worker threads, blocks until a process has written output_path
+        with metrics.span('transcode', path=path):
+            return self.pool.run(transcode_image, path, output_path, self.policies)
+
+    def shutdown(self):
+        self.pool.shutdown()
@@ -0,0 +1,261 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .metrics import metrics
+from .rate_limit import HostRateController
+
+# Errors worth resuming from: the bytes already in the .part file are kept
+RESUMABLE_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+    IOError,
+)
+CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+STATE_SAVE_INTERVAL = 1.0
+# Bounds of the adaptive iter_content chunk size
+MIN_CHUNK_SIZE = 16 * 1024
+MAX_CHUNK_SIZE = 1024 * 1024
+
+class IncompleteDownload(IOError):
+    pass
+
+def file_sha256(path, sha256=None, limit=None):
+    # Hashes the file (or its first limit bytes) in chunks, continuing sha256 if given
+    sha256 = sha256 or hashlib.sha256()
+    remaining = limit
+    with open(path, "rb") as f:
+        while remaining is None or remaining > 0:
+            chunk = f.read(1024 * 1024 if remaining is None else min(1024 * 1024, remaining))
+            if not chunk:
+                break
+            sha256.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return sha256
+
+def chunk_size_for(length):
+    # About 64 reads per transfer: small files don't wait on a big buffer,
+    # big ones don't pay a Python loop iteration every 64 KiB
+    if not length:
+        return 64 * 1024
+    size = MIN_CHUNK_SIZE
+    while size < MAX_CHUNK_SIZE and size * 64 < length:
+        size *= 2
+    return size
+
+def state_path(part_path):
+    return part_path + ".json"
+
+def load_state(part_path, url):
+    # The sidecar is only trusted when it belongs to the same URL and the .part file is still there
+    try:
+        with open(state_path(part_path), "r") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get('url') != url or not os.path.exists(part_path):
+        return None
+    return state
+
+def save_state(part_path, state):
+    temp_path = state_path(part_path) + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(temp_path, state_path(part_path))
+
+def clear_state(part_path):
+    for path in (part_path, state_path(part_path)):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def validator_headers(headers, state):
+    # If-Range makes the server send the whole file again if it changed since the .part was written
+    headers = dict(headers)
+    validator = state.get('etag') or state.get('last_modified') if state else None
+    if validator:
+        headers['If-Range'] = validator
+    return headers
+
+def total_size(response):
+    match = CONTENT_RANGE.match(response.headers.get("Content-Range", ""))
+    if match:
+        return int(match.group(3)) if match.group(3) != "*" else None
+    length = response.headers.get("Content-Length")
+    return int(length) if length and length.isdigit() else None
+
+def probe(session, url, headers, timeout):
+    # HEAD request telling us the size and whether byte ranges are supported
+    try:
+        response = session.head(url, headers=headers, allow_redirects=True, timeout=timeout)
+        response.raise_for_status()
+    except Exception:
+        return None
+    return {
+        'total': total_size(response),
+        'ranges': response.headers.get("Accept-Ranges", "").lower() == "bytes",
+        'etag': response.headers.get("ETag"),
+        'last_modified': response.headers.get("Last-Modified"),
+    }
+
+def stream_to_part(session, url, headers, part_path, on_bytes, timeout):
+    # Single connection download, appending to whatever an earlier attempt left behind.
+    # The SHA-256 is computed while writing; only a resumed prefix is read back.
+    state = load_state(part_path, url)
+    offset = os.path.getsize(part_path) if state else 0
+
+    request_headers = validator_headers(headers, state)
+    if offset:
+        request_headers['Range'] = f"bytes={offset}-"
+
+    with session.get(url, headers=request_headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 416 and state and offset == state.get('total'):
+            return response.headers, file_sha256(part_path).hexdigest()  # Everything was already there
+        response.raise_for_status()
+
+        if offset and response.status_code != 206:
+            offset = 0  # Range ignored or file changed, start over
+
+        state = {
+            'url': url,
+            'etag': response.headers.get("ETag"),
+            'last_modified': response.headers.get("Last-Modified"),
+            'total': total_size(response),
+        }
+        save_state(part_path, state)
+        chunk_size = chunk_size_for(state['total'] and state['total'] - offset)
+
+        sha256 = file_sha256(part_path, limit=offset) if offset else hashlib.sha256()
+        with open(part_path, "r+b" if offset else "wb") as f:
+            f.seek(offset)
+            f.truncate()
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if chunk:  # filter out keep-alive new chunks
+                    f.write(chunk)
+                    sha256.update(chunk)
+                    on_bytes(len(chunk))
+
+        if state['total'] is not None and os.path.getsize(part_path) != state['total']:
+            raise IncompleteDownload(f"Got {os.path.getsize(part_path)} of {state['total']} bytes")
+        return response.headers, sha256.hexdigest()
+
+def segmented_to_part(session, url, headers, part_path, info, segments, on_bytes, timeout):
+    # Parallel byte-range download into a preallocated .part file; each segment remembers
+    # how far it got so an interrupted transfer resumes every segment where it stopped
+    total = info['total']
+    state = load_state(part_path, url)
+    if state is None or state.get('total') != total or not state.get('segments') \
+            or (info['etag'] and state.get('etag') != info['etag']) \
+            or (info['last_modified'] and state.get('last_modified') != info['last_modified']):
+        step = -(-total // segments)
+        state = {
+            'url': url,
+            'etag': info['etag'],
+            'last_modified': info['last_modified'],
+            'total': total,
+            'segments': [[start, min(start + step, total) - 1, 0] for start in range(0, total, step)],
+        }
+        with open(part_path, "wb") as f:
+            f.truncate(total)
+        save_state(part_path, state)
+
+    lock = threading.Lock()
+    last_save = [time.monotonic()]
+
+    def fetch_segment(segment):
+        start, end, written = segment
+        if start + written > end:
+            return
+
+        segment_headers = validator_headers(headers, state)
+        segment_headers['Range'] = f"bytes={start + written}-{end}"
+        with session.get(url, headers=segment_headers, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                # If-Range got the whole file: it changed under us, so the next attempt starts over
+                with lock:
+                    state['segments'] = None
+                raise IncompleteDownload("Server stopped honouring byte ranges")
+
+            with open(part_path, "r+b") as f:
+                f.seek(start + written)
+                for chunk in response.iter_content(chunk_size=chunk_size_for(end + 1 - start - written)):
+                    if not chunk:
+                        continue
+                    chunk = chunk[:end + 1 - (start + segment[2])]
+                    f.write(chunk)
+                    on_bytes(len(chunk))
+                    with lock:
+                        segment[2] += len(chunk)
+                        if time.monotonic() - last_save[0] >= STATE_SAVE_INTERVAL:
+                            save_state(part_path, state)
+                            last_save[0] = time.monotonic()
+
+        if start + segment[2] <= end:
+            raise IncompleteDownload(f"Segment {start}-{end} ended early")
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(state['segments'])) as executor:
+            for future in [executor.submit(fetch_segment, segment) for segment in state['segments']]:
+                future.result()
+    finally:
+        with lock:
+            save_state(part_path, state)
+
+    # Segments land out of order, so this is the one case that hashes after the fact
+    headers = {'ETag': info['etag'] or "", 'Last-Modified': info['last_modified'] or ""}
+    return headers, file_sha256(part_path).hexdigest()
+
+def download_to_part(session, url, headers, part_path, configdata, on_bytes, segmented=False, rate=None):
+    # Fills part_path with the complete file, resuming after dropped connections.
+    # Returns (response headers, SHA-256 hex digest of the file).
+    # rate paces every attempt and is the only retry loop: up to downloadRetries attempts in all,
+    # for throttling as well as resumable errors, each holding as many host slots as it opens connections.
+    rate = rate or HostRateController.from_config(configdata)
+    timeout = (5, configdata.get("downloadReadTimeout", 30))
+    # Sizes are validated against Content-Length, so ask for the bytes exactly as stored
+    headers = dict(headers, **{'Accept-Encoding': 'identity'})
+
+    info = None
+    if segmented:
+        with rate.slot(url):
+            info = probe(session, url, headers, timeout)
+        threshold = configdata.get("segmentedThresholdMB", 32) * 1024 * 1024
+        if not info or not info['ranges'] or not info['total'] or info['total'] < threshold:
+            info = None
+    segments = max(1, configdata.get("downloadSegments", 4)) if info else 1
+
+    last_error = [None]
+
+    def attempt():
+        # Only a transfer cut short is a resume; throttling and 5xx replies count as backoffs in rate
+        if last_error[0] is not None and getattr(last_error[0], 'response', None) is None:
+            metrics.inc('scraper_retries_total')
+            print(f"Transfer of {url} interrupted ({last_error[0]}), resuming...")
+        try:
+            if info:
+                return segmented_to_part(session, url, headers, part_path, info, segments, on_bytes, timeout)
+            return stream_to_part(session, url, headers, part_path, on_bytes, timeout)
+        except Exception as e:
+            last_error[0] = e
+            raise
+
+    return rate.call(url, attempt, retries=configdata.get("downloadRetries", 3),
+                     retry_errors=RESUMABLE_ERRORS, connections=segments)
+
+def finish_part(part_path, filepath):
+    # Atomic, so filepath only ever exists as a complete file
+    os.replace(part_path, filepath)
+    try:
+        os.remove(state_path(part_path))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,85 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .net import USER_AGENT, make_session
+from .rate_limit import HostRateController
+from .transfer import total_size
+
+def probe_size(session, url, headers, timeout, rate):
+    # Size in bytes from a HEAD request, or from the Content-Range of a one byte GET
+    # when the server rejects HEAD or leaves out Content-Length. Both go through rate
+    # without retries, a failed probe is simply tried again the next time it is asked for.
+    def head():
+        response = session.head(url, headers=headers, timeout=timeout, allow_redirects=True)
+        response.raise_for_status()
+        return response
+
+    def first_byte():
+        range_headers = dict(headers or {}, Range="bytes=0-0")
+        range_headers['Accept-Encoding'] = "identity"
+        with session.get(url, headers=range_headers, timeout=timeout, stream=True) as response:
+            response.raise_for_status()
+            return total_size(response)
+
+    try:
+        response = rate.call(url, head, retries=0)
+        if not response.headers.get("Content-Encoding"):
+            length = response.headers.get("Content-Length", "")
+            if length.isdigit() and int(length) > 0:
+                return int(length)
+    except Exception as e:
+        print(f"HEAD failed for {url}: {e}")
+
+    try:
+        return rate.call(url, first_byte, retries=0)
+    except Exception as e:
+        print(f"Failed to get video size: {e}")
+        return None
+
+class VideoSizeProbe:
+    # Probes video sizes concurrently over one pooled session and remembers them by URL,
+    # so a page full of videos costs a handful of round-trips and a re-scrape costs none
+    def __init__(self, workers=16, timeout=5, max_entries=4096, rate=None):
+        self.timeout = timeout
+        self.rate = rate or HostRateController()
+        self.max_entries = max_entries
+        self.session = make_session(workers, {"User-Agent": USER_AGENT})
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.lock = threading.Lock()
+        # url -> Future resolving to the size in bytes (or None)
+        self.sizes = OrderedDict()
+
+    @classmethod
+    def from_config(cls, configdata):
+        return cls(max(1, configdata.get("videoProbeWorkers", 16)), configdata.get("videoProbeTimeout", 5),
+                   rate=HostRateController.from_config(configdata))
+
+    def submit(self, url, headers=None):
+        with self.lock:
+            future = self.sizes.get(url)
+            # A failed probe is retried next time instead of being remembered
+            if future is not None and not (future.done() and future.result() is None):
+                self.sizes.move_to_end(url)
+                return future
+
+            future = self.executor.submit(probe_size, self.session, url, headers, self.timeout, self.rate)
+            self.sizes[url] = future
+            while len(self.sizes) > self.max_entries:
+                self.sizes.popitem(last=False)
+            return future
+
+    def prefetch(self, urls, headers=None):
+        # Starts every probe at once; size_mb() later just waits for its own result
+        for url in urls:
+            self.submit(url, headers)
+
+    def size_mb(self, url, headers=None):
+        size_in_bytes = self.submit(url, headers).result()
+        if size_in_bytes is None:
+            return None
+        return round(size_in_bytes / (1024 * 1024), 2)  # Round to 2 decimal places
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()